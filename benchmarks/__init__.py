@@ -0,0 +1 @@
+"""Offline benchmark suite for the download pipeline. Run with `python -m benchmarks`."""
@@ -0,0 +1,119 @@
+"""Runs the benchmark suite and compares it against a saved baseline.
+
+Examples:
+    python -m benchmarks --out results.json
+    python -m benchmarks --quick --only progress_hook memory
+    python -m benchmarks --baseline benchmarks/baseline.json --threshold 10
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from .cases import BENCHMARKS, BenchmarkError, Context, missing_requirement
+
+def environment():
+    """Describes the machine and tool versions, so results from different setups are not mixed up."""
+    info = {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()}
+    try:
+        import yt_dlp.version
+        info['yt_dlp'] = yt_dlp.version.__version__
+    except ImportError:
+        info['yt_dlp'] = None
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+        info['ffmpeg'] = output.decode('utf-8', 'replace').split('\n', 1)[0]
+    except OSError:
+        info['ffmpeg'] = None
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+        info['revision'] = revision.stdout.decode().strip() or None
+    except OSError:
+        info['revision'] = None
+    return info
+
+def run(names, ctx):
+    """Runs the selected cases and returns the result document."""
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'quick': ctx.quick, 'environment': environment(),
+               'metrics': {}, 'skipped': {}, 'failed': {}}
+    for case in BENCHMARKS:
+        if names and case.name not in names: continue
+        missing = missing_requirement(case.requires)
+        if missing:
+            results['skipped'][case.name] = f"{missing} not available"
+            print(f"{case.name}: skipped ({missing} not available)")
+            continue
+        print(f"{case.name}: running...", flush=True)
+        try:
+            metrics = case.func(ctx)
+        except BenchmarkError as e:
+            results['failed'][case.name] = str(e)
+            print(f"{case.name}: FAILED: {e}")
+            continue
+        except Exception as e:
+            results['failed'][case.name] = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+            continue
+        for name, metric in metrics.items():
+            results['metrics'][f"{case.name}.{name}"] = {'value': metric.value, 'unit': metric.unit, 'better': metric.better}
+            print(f"  {name}: {metric.value:.6g} {metric.unit}")
+    return results
+
+def compare(results, baseline, threshold):
+    """Prints each metric against the baseline. Returns the names of metrics that regressed by more than threshold %."""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('created', '?')} (threshold {threshold:g}%):")
+    for name, metric in sorted(results['metrics'].items()):
+        old = baseline.get('metrics', {}).get(name)
+        if old is None or not old['value']:
+            print(f"  {name}: {metric['value']:.6g} {metric['unit']} (no baseline)")
+            continue
+        change = (metric['value'] - old['value']) / abs(old['value']) * 100
+        worse = change > threshold if metric['better'] == 'lower' else change < -threshold
+        if worse: regressions.append(name)
+        print(f"  {name}: {old['value']:.6g} -> {metric['value']:.6g} {metric['unit']} ({change:+.1f}%){'  REGRESSION' if worse else ''}")
+    if results['environment'] != baseline.get('environment'):
+        print("  Note: the baseline was recorded in a different environment; compare with care.")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Offline benchmarks for the download pipeline.")
+    parser.add_argument('--only', nargs='+', metavar='CASE', choices=[case.name for case in BENCHMARKS],
+                        help="run only these cases")
+    parser.add_argument('--quick', action='store_true', help="smaller workloads, for a fast sanity check")
+    parser.add_argument('--out', metavar='FILE', help="write the results to FILE as JSON (use it as a baseline later)")
+    parser.add_argument('--baseline', metavar='FILE', help="compare against results saved with --out")
+    parser.add_argument('--threshold', type=float, default=10.0, metavar='PCT',
+                        help="change in percent that counts as a regression (default: 10)")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'mp3downloader-bench'), metavar='DIR',
+                        help="scratch and generated-media cache directory")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case in BENCHMARKS:
+            requires = f" (needs {', '.join(case.requires)})" if case.requires else ''
+            print(f"{case.name}: {case.func.__doc__}{requires}")
+        return 0
+
+    results = run(args.only, Context(args.work_dir, args.quick))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.out}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 1 if results['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,589 @@
+"""The benchmark cases. Each returns {metric name: Metric}; names are prefixed with the case name."""
+import contextlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from time import perf_counter
+
+from downloader.bandwidth import JobThrottle, TokenBucket
+from downloader.channel import LatestValueChannel
+from downloader.engine import AUDIO_FORMATS, VIDEO_FORMATS, DownloadEngine, Job
+from downloader.importer import open_source, read_urls
+from downloader.journal import QueueJournal
+from downloader.retry import CircuitBreaker, RetryPolicy
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows: no child CPU accounting, the transcode case compares wall time instead
+
+from .media import audio_file, have_ffmpeg, sized_file, video_file
+from .server import MediaServer
+
+# The GUI applies queued updates every gui.UI_REFRESH_MS; the gui module needs ttkthemes, so it is mirrored here
+UI_FRAME_SECONDS = 0.066
+
+# What a case must show for its result to count; a case that misses it raises BenchmarkError
+MIN_WORKER_SPEEDUP = 2.0 # 4 workers over 1, on a server that caps each connection
+MAX_TRIMMED_RATIO = 0.25 # bytes for a 30 s clip (a tenth) of a 5 minute file, against the whole file
+MAX_CAP_ERROR_PCT = 3.0 # rate of capped jobs as the server sees it, against the cap
+MIN_PREFETCH_SPEEDUP = 1.25 # queue time without prefetch over with it, when every request waits 50 ms
+
+# better is "lower" or "higher"; it decides which direction counts as a regression
+Metric = namedtuple('Metric', 'value unit better')
+
+Benchmark = namedtuple('Benchmark', 'name requires func')
+BENCHMARKS = []
+
+def benchmark(*requires):
+    """Registers a case. `requires` names what it needs: 'ffmpeg', 'yt_dlp' or 'tk'."""
+    def register(func):
+        BENCHMARKS.append(Benchmark(func.__name__, requires, func))
+        return func
+    return register
+
+def missing_requirement(requires):
+    """Returns the first requirement that is not available here, or None."""
+    for requirement in requires:
+        if requirement == 'ffmpeg' and not have_ffmpeg(): return 'ffmpeg'
+        if requirement == 'yt_dlp':
+            try:
+                import yt_dlp # noqa: F401
+            except ImportError:
+                return 'yt_dlp'
+        if requirement == 'tk':
+            try:
+                import tkinter
+                tkinter.Tk().destroy()
+            except Exception:
+                return 'tk (display)'
+    return None
+
+class BenchmarkError(Exception):
+    """Raised when a case cannot produce a valid measurement (e.g. a download failed)."""
+
+class Context:
+    """Scratch space, cached media and size settings shared by the cases."""
+    def __init__(self, work_dir, quick=False):
+        self.work_dir = work_dir
+        self.media_dir = os.path.join(work_dir, 'media')
+        self.quick = quick
+        os.makedirs(self.media_dir, exist_ok=True)
+
+    def size(self, full, quick):
+        return quick if self.quick else full
+
+    def scratch(self, name):
+        """Returns an empty directory for one run of a case."""
+        path = os.path.join(self.work_dir, 'scratch', name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    @contextlib.contextmanager
+    def serve(self, source, count, latency=0.0, bandwidth=0):
+        """Serves `count` distinct names (item-0.ext, item-1.ext, ...) for one source file. Yields (server, urls)."""
+        directory = self.scratch('served')
+        ext = os.path.splitext(source)[1]
+        names = [f"item-{index}{ext}" for index in range(count)]
+        for name in names:
+            try:
+                os.link(source, os.path.join(directory, name))
+            except OSError:
+                shutil.copyfile(source, os.path.join(directory, name))
+        server = MediaServer(directory, latency, bandwidth)
+        try:
+            yield server, [server.url(name) for name in names]
+        finally:
+            server.close()
+
+def child_cpu_seconds():
+    """User plus system CPU time of all finished child processes (ffmpeg, ffprobe), or None where unavailable."""
+    if resource is None: return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def fitted_rate(samples):
+    """Least-squares slope of (time, count) samples: a rate that block-sized steps in the count barely move."""
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_count = sum(count for _, count in samples) / len(samples)
+    covariance = sum((t - mean_t) * (count - mean_count) for t, count in samples)
+    return covariance / sum((t - mean_t) ** 2 for t, _ in samples)
+
+def best_of(repeats, func):
+    """Runs func `repeats` times and returns the fastest wall time in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    return min(times)
+
+def run_queue(urls, out_dir, workers=4, prefetch=0, job_format='m4a', engine_options=None, **options):
+    """Runs a DownloadEngine over urls the way the GUI does (updates go through a coalescing
+    channel) and returns (seconds, engine). Raises BenchmarkError if a job failed."""
+    channel = LatestValueChannel()
+    engine = DownloadEngine(out_dir, workers, on_update=lambda job: channel.post(job.id, job), log=lambda message: None,
+                            prefetch_workers=prefetch, skip_existing=False, transcode_workers=2, **(engine_options or {}))
+    try:
+        engine.add_many(urls, type='audio', format=job_format, **options)
+        # yt-dlp prints a few lines per job; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            start = perf_counter()
+            engine.run()
+            elapsed = perf_counter() - start
+    finally:
+        engine.close()
+    failed = [job for job in engine.jobs if job.status != 'Complete']
+    if failed: raise BenchmarkError(f"{len(failed)} job(s) did not complete, e.g. {failed[0].url}: {failed[0].status}")
+    return elapsed, engine
+
+@benchmark('yt_dlp', 'ffmpeg')
+def queue_throughput(ctx):
+    """End-to-end queue throughput and worker scaling against a bandwidth-capped server."""
+    count = ctx.size(24, 8)
+    source = sized_file(ctx.media_dir, 'm4a', 1024 * 1024)
+    size = os.path.getsize(source)
+    results = {}
+    with ctx.serve(source, count, latency=0.02, bandwidth=2 * 1024 * 1024) as (server, urls):
+        for workers in (1, 2, 4, 8):
+            elapsed, _ = run_queue(urls, ctx.scratch('out'), workers)
+            results[f'workers_{workers}.jobs_per_sec'] = Metric(count / elapsed, 'jobs/s', 'higher')
+            results[f'workers_{workers}.mb_per_sec'] = Metric(count * size / elapsed / 1048576, 'MB/s', 'higher')
+    speedup = results['workers_4.jobs_per_sec'].value / results['workers_1.jobs_per_sec'].value
+    results['speedup_4_over_1'] = Metric(speedup, 'x', 'higher')
+    if speedup < MIN_WORKER_SPEEDUP:
+        raise BenchmarkError(f"4 workers were only {speedup:.2f}x as fast as 1 (expected at least {MIN_WORKER_SPEEDUP}x)")
+    return results
+
+@benchmark('yt_dlp', 'ffmpeg')
+def per_job_overhead(ctx):
+    """Wall time per job for tiny files on an unthrottled server: the queue's fixed cost per item."""
+    count = ctx.size(50, 15)
+    source = audio_file(ctx.media_dir, 'm4a', seconds=1, bitrate='32k')
+    with ctx.serve(source, count) as (server, urls):
+        elapsed, _ = run_queue(urls, ctx.scratch('out'), workers=1)
+    return {'seconds_per_job': Metric(elapsed / count, 's', 'lower')}
+
+@benchmark('yt_dlp', 'ffmpeg')
+def prefetch(ctx):
+    """Queue time with and without the metadata prefetch stage, for many small items on a slow-to-answer server."""
+    count = ctx.size(200, 40)
+    source = audio_file(ctx.media_dir, 'm4a', seconds=1, bitrate='32k')
+    results = {}
+    with ctx.serve(source, count, latency=0.05) as (server, urls):
+        for prefetch_workers in (0, 4):
+            mode = 'on' if prefetch_workers else 'off'
+            server.reset_counters()
+            elapsed, _ = run_queue(urls, ctx.scratch('out'), workers=2, prefetch=prefetch_workers)
+            results[f'{mode}.seconds'] = Metric(elapsed, 's', 'lower')
+            # More requests with prefetch on than off means the download stage extracted again
+            results[f'{mode}.requests_per_job'] = Metric(server.requests / count, 'requests', 'lower')
+    speedup = results['off.seconds'].value / results['on.seconds'].value
+    results['speedup'] = Metric(speedup, 'x', 'higher')
+    if speedup < MIN_PREFETCH_SPEEDUP:
+        raise BenchmarkError(f"prefetch made the queue only {speedup:.2f}x as fast (expected at least "
+                             f"{MIN_PREFETCH_SPEEDUP}x; {results['on.requests_per_job'].value:g} requests per job "
+                             f"with it, {results['off.requests_per_job'].value:g} without)")
+    return results
+
+@benchmark('yt_dlp', 'ffmpeg')
+def trimmed_transfer(ctx):
+    """Bytes fetched for a 30 s clip of a 5 minute file, against the full download."""
+    source = audio_file(ctx.media_dir, 'm4a', seconds=300, bitrate='128k')
+    with ctx.serve(source, 2) as (server, urls):
+        run_queue(urls[:1], ctx.scratch('out'), workers=1)
+        full = server.bytes_sent
+        server.reset_counters()
+        run_queue(urls[1:], ctx.scratch('out'), workers=1, start_time='120', end_time='150')
+        trimmed = server.bytes_sent
+    if trimmed / full > MAX_TRIMMED_RATIO:
+        raise BenchmarkError(f"the 30 s clip fetched {trimmed / full:.0%} of the full file's bytes "
+                             f"(expected at most {MAX_TRIMMED_RATIO:.0%})")
+    return {
+        'full_bytes': Metric(full, 'B', 'lower'),
+        'trimmed_bytes': Metric(trimmed, 'B', 'lower'),
+        'trimmed_ratio': Metric(trimmed / full, 'ratio', 'lower'),
+    }
+
+@benchmark('yt_dlp')
+def session_overhead(ctx):
+    """Cost of building a YoutubeDL per job against borrowing one from the session pool."""
+    import yt_dlp
+    from downloader.engine import build_ydl_opts
+    from downloader.sessions import SessionPool
+
+    count = ctx.size(200, 50)
+    opts = build_ydl_opts(Job('bench', 'http://127.0.0.1/x'), ctx.work_dir)
+    opts.pop('progress_hooks')
+
+    def fresh():
+        for _ in range(count):
+            with yt_dlp.YoutubeDL(opts):
+                pass
+
+    pool = SessionPool()
+    def pooled():
+        for _ in range(count):
+            with pool.session(opts):
+                pass
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        fresh_seconds = best_of(3, fresh)
+        pooled_seconds = best_of(3, pooled)
+    pool.close()
+    return {
+        'fresh.ms_per_job': Metric(fresh_seconds / count * 1000, 'ms', 'lower'),
+        'pooled.ms_per_job': Metric(pooled_seconds / count * 1000, 'ms', 'lower'),
+    }
+
+@benchmark()
+def progress_hook(ctx):
+    """Cost of one yt-dlp progress report through the engine: status, journal and UI channel."""
+    calls = ctx.size(200000, 50000)
+    jobs_count = 200
+    journal = QueueJournal(os.path.join(ctx.scratch('journal'), 'queue.db'))
+    channel = LatestValueChannel()
+    engine = DownloadEngine(ctx.scratch('out'), on_update=lambda job: channel.post(job.id, job), log=lambda message: None,
+                            journal=journal, prefetch_workers=0)
+    jobs = [engine.add(f'http://127.0.0.1/{index}', prefetch=False) for index in range(jobs_count)]
+    throttle = JobThrottle([engine.bandwidth, TokenBucket()])
+    reports = [{'status': 'downloading', 'downloaded_bytes': index * 1024, 'total_bytes': calls * 1024} for index in range(calls)]
+
+    def run(with_throttle):
+        for index, d in enumerate(reports):
+            engine.progress_hook(d, jobs[index % jobs_count], throttle if with_throttle else None)
+
+    plain = best_of(3, lambda: run(False))
+    throttled = best_of(3, lambda: run(True))
+    engine.close()
+    return {
+        'us_per_call': Metric(plain / calls * 1e6, 'us', 'lower'),
+        'throttled.us_per_call': Metric(throttled / calls * 1e6, 'us', 'lower'),
+    }
+
+@benchmark()
+def ui_coalescing(ctx):
+    """Worker threads flood the UI with updates while a consumer applies them at the GUI's frame rate:
+    the coalescing channel against the old path, where every update was its own Tk callback."""
+    import queue
+
+    threads, per_thread, jobs_count = 8, ctx.size(50000, 10000), 200
+    rows = {}
+
+    def apply(key, value):
+        # Stands in for refreshing the job's Treeview row
+        rows[key] = f'Downloading {value / per_thread * 100:.1f}%'
+
+    def flood(post, drain):
+        """Runs the producers against a consumer that drains every frame; returns the consumer's busy seconds."""
+        done = threading.Event()
+
+        def produce(offset):
+            for index in range(per_thread):
+                post(f'job_{(offset + index) % jobs_count}', index)
+
+        workers = [threading.Thread(target=produce, args=(offset,)) for offset in range(threads)]
+        for worker in workers: worker.start()
+        threading.Thread(target=lambda: ([worker.join() for worker in workers], done.set()), daemon=True).start()
+        busy = 0.0
+        while True:
+            finished = done.is_set()
+            began = perf_counter()
+            for key, value in drain(): apply(key, value)
+            busy += perf_counter() - began
+            if finished: return busy
+            time.sleep(UI_FRAME_SECONDS)
+
+    channel = LatestValueChannel()
+    coalesced = flood(channel.post, channel.drain)
+
+    # Old path: root.after(0, ...) per update, i.e. one queued callback per post, all of them run
+    events = queue.SimpleQueue()
+    def drain_events():
+        while True:
+            try:
+                yield events.get_nowait()
+            except queue.Empty:
+                return
+    per_event = flood(lambda key, value: events.put((key, value)), drain_events)
+
+    if channel.drained >= channel.posted:
+        raise BenchmarkError(f"the channel applied all {channel.posted} updates; nothing was coalesced")
+    return {
+        'applied_ratio': Metric(channel.drained / channel.posted, 'ratio', 'lower'),
+        'ui_seconds': Metric(coalesced, 's', 'lower'),
+        'per_event.ui_seconds': Metric(per_event, 's', 'lower'),
+        'ui_time_saved': Metric(per_event / coalesced if coalesced else float('inf'), 'x', 'higher'),
+    }
+
+@benchmark('tk')
+def ui_treeview(ctx):
+    """Treeview cost of the queue view: inserting rows and refreshing the rows changed in one frame."""
+    import tkinter as tk
+    from tkinter import ttk
+
+    rows, changed = ctx.size(10000, 2000), 200
+    root = tk.Tk()
+    root.withdraw()
+    columns = ('#', 'url', 'title', 'duration', 'size', 'type', 'format', 'trim', 'priority', 'limit', 'status')
+    tree = ttk.Treeview(root, columns=columns, show='headings')
+    try:
+        start = perf_counter()
+        for index in range(rows):
+            tree.insert('', tk.END, iid=f'job_{index}', values=(index, f'http://127.0.0.1/{index}') + ('',) * 9)
+        root.update_idletasks()
+        insert_seconds = perf_counter() - start
+
+        def frame():
+            for index in range(changed):
+                tree.item(f'job_{index * (rows // changed)}', values=(index, 'url', 'title', '1:00', '1 MB', 'Audio',
+                                                                       'mp3', 'Full', 'Normal', 'Unlimited', 'Downloading 50.0%'))
+            root.update_idletasks()
+        frame_seconds = best_of(5, frame)
+    finally:
+        root.destroy()
+    return {
+        'insert.us_per_row': Metric(insert_seconds / rows * 1e6, 'us', 'lower'),
+        'frame.ms': Metric(frame_seconds * 1000, 'ms', 'lower'),
+    }
+
+@benchmark('ffmpeg')
+def transcode(ctx):
+    """ffmpeg stage wall and CPU time per target format, and stream copy against a full re-encode."""
+    from downloader.transcode import AUDIO_CODEC_ARGS, run_ffmpeg, transcode_file
+
+    seconds = ctx.size(120, 30)
+    sources = {
+        'audio': audio_file(ctx.media_dir, 'webm', seconds=seconds),
+        'video': video_file(ctx.media_dir, 'mp4', seconds=ctx.size(20, 5)),
+    }
+    results = {}
+
+    def measure(name, func):
+        """Records the wall time and the CPU time of the ffmpeg processes func runs."""
+        cpu_before, start = child_cpu_seconds(), perf_counter()
+        func()
+        results[f'{name}.seconds'] = Metric(perf_counter() - start, 's', 'lower')
+        if cpu_before is not None:
+            results[f'{name}.cpu_seconds'] = Metric(child_cpu_seconds() - cpu_before, 's', 'lower')
+
+    def convert(job_type, job_format, source):
+        work = ctx.scratch('transcode')
+        # transcode_file replaces its input, so convert a copy
+        src = os.path.join(work, f"source{os.path.splitext(source)[1]}")
+        shutil.copyfile(source, src)
+        return lambda: transcode_file(src, job_type, job_format)
+
+    for job_format in AUDIO_FORMATS:
+        measure(f'audio.{job_format}', convert('audio', job_format, sources['audio']))
+    for job_format in VIDEO_FORMATS:
+        measure(f'video.{job_format}', convert('video', job_format, sources['video']))
+
+    # An AAC source going to m4a is remuxed; forcing the encoder shows what the copy saves
+    aac = audio_file(ctx.media_dir, 'm4a', seconds=seconds)
+    measure('m4a.copy', convert('audio', 'm4a', aac))
+    encode_out = os.path.join(ctx.scratch('encode'), 'out.m4a')
+    measure('m4a.encode', lambda: run_ffmpeg(['-i', aac, '-vn'] + AUDIO_CODEC_ARGS['m4a'] + [encode_out]))
+
+    unit = 'cpu_seconds' if 'm4a.copy.cpu_seconds' in results else 'seconds'
+    copy, encode = results[f'm4a.copy.{unit}'].value, results[f'm4a.encode.{unit}'].value
+    if copy >= encode:
+        raise BenchmarkError(f"stream copy took {copy:.2f} {unit.replace('_', ' ')}, "
+                             f"no less than re-encoding ({encode:.2f})")
+    return results
+
+@benchmark('yt_dlp', 'ffmpeg')
+def bandwidth_cap(ctx):
+    """How closely three jobs run by the engine hold a 4 MB/s global cap, measured at the server."""
+    cap, seconds = 4 * 1024 * 1024, ctx.size(5, 2)
+    # Enough for the jobs to keep downloading through the measurement and the second before it
+    source = sized_file(ctx.media_dir, 'm4a', cap * (seconds + 3) // 3, seconds=600)
+    rates = []
+    with ctx.serve(source, 3) as (server, urls):
+        finished = threading.Event()
+
+        def measure():
+            # Start a second after the first bytes arrive, past the bucket's initial burst and the
+            # receive buffers filling up
+            while not server.bytes_sent:
+                if finished.wait(0.01): return
+            time.sleep(1)
+            samples, start = [], perf_counter()
+            while perf_counter() - start < seconds:
+                samples.append((perf_counter(), server.bytes_sent))
+                time.sleep(0.05)
+            rates.append(fitted_rate(samples))
+
+        sampler = threading.Thread(target=measure)
+        sampler.start()
+        try:
+            # One connection per job: a connection opening mid-measurement would count its receive buffer early
+            run_queue(urls, ctx.scratch('out'), workers=3, engine_options={'rate_limit': cap, 'segments': 1})
+        finally:
+            finished.set()
+            sampler.join()
+    rate = rates[0]
+    error_pct = abs(rate - cap) / cap * 100
+    if error_pct > MAX_CAP_ERROR_PCT:
+        raise BenchmarkError(f"jobs moved {rate / 1048576:.2f} MB/s under a {cap / 1048576:g} MB/s cap "
+                             f"({error_pct:.1f}% off, expected within {MAX_CAP_ERROR_PCT:g}%)")
+    return {
+        'measured_mb_per_sec': Metric(rate / 1048576, 'MB/s', 'lower'),
+        'error_pct': Metric(error_pct, '%', 'lower'),
+    }
+
+@benchmark()
+def memory(ctx):
+    """Python heap used per queued job, and for the whole queue."""
+    count = ctx.size(100000, 20000)
+    urls = [f'https://www.youtube.com/watch?v={index:011d}' for index in range(count)]
+
+    def fill():
+        engine = DownloadEngine(ctx.scratch('out'), log=lambda message: None, prefetch_workers=0)
+        for url in urls: engine.add(url, prefetch=False)
+        return engine
+
+    # Timed without tracemalloc, which slows allocation down several times
+    add_seconds = best_of(3, lambda: fill().close())
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        engine = fill()
+        used, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    engine.close()
+    return {
+        'bytes_per_job': Metric((used - before) / count, 'B', 'lower'),
+        'queue_peak_mb': Metric((peak - before) / 1048576, 'MB', 'lower'),
+        'add.us_per_job': Metric(add_seconds / count * 1e6, 'us', 'lower'),
+    }
+
+@benchmark()
+def bulk_import(ctx):
+    """Streaming import of a large text and JSON link list, a tenth of it duplicates in other URL forms."""
+    count = ctx.size(100000, 20000)
+    directory = ctx.scratch('import')
+    urls = [f'https://www.youtube.com/watch?v={index:011d}&utm_source=list' for index in range(count - count // 10)]
+    urls += [f'https://youtu.be/{index:011d}?si=share' for index in range(count // 10)]
+    paths = {'text': os.path.join(directory, 'links.txt'), 'json': os.path.join(directory, 'links.json')}
+    with open(paths['text'], 'w', encoding='utf-8') as f:
+        f.writelines(f"{url}\n" for url in urls)
+    with open(paths['json'], 'w', encoding='utf-8') as f:
+        json.dump([{'url': url, 'title': 'Some title'} for url in urls], f)
+    del urls
+
+    metrics = {}
+    for fmt, path in paths.items():
+        def run():
+            engine = DownloadEngine(ctx.scratch('out'), log=lambda message: None, prefetch_workers=0)
+            with open_source(path) as stream:
+                result = engine.import_urls(read_urls(stream, name=path))
+            engine.close()
+            if result.duplicates != count // 10:
+                raise BenchmarkError(f"{result.duplicates} duplicates found instead of {count // 10}")
+
+        metrics[f'{fmt}.lines_per_s'] = Metric(count / best_of(3, run), 'lines/s', 'higher')
+        # The reader alone must not hold the file in memory
+        tracemalloc.start()
+        try:
+            with open_source(path) as stream:
+                for _ in read_urls(stream, name=path): pass
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        metrics[f'{fmt}.reader_peak_kb'] = Metric(peak / 1024, 'KB', 'lower')
+    return metrics
+
+@benchmark('yt_dlp', 'ffmpeg')
+def retries(ctx):
+    """Recovery from injected faults: transient errors and 429s are retried, a 404 is not, and a host
+    in an outage cools down behind its circuit breaker while the other host keeps downloading."""
+    count, outage = ctx.size(12, 6), ctx.size(3.0, 1.5)
+    source = audio_file(ctx.media_dir, 'm4a', seconds=1, bitrate='32k')
+    with ctx.serve(source, count) as (healthy, _):
+        # Same files on a second port, addressed as "localhost" so it counts as another host
+        failing = MediaServer(healthy.directory)
+        ext = os.path.splitext(source)[1]
+        names = [f"item-{index}{ext}" for index in range(count)]
+        healthy.fail(names[0], 503, 503)
+        healthy.fail(names[1], 'reset')
+        healthy.fail(names[2], 'truncate')
+        healthy.fail(names[3], 429)
+        healthy.fail(names[4], *[404] * 10)
+        failing.set_outage(503)
+        recover = threading.Timer(outage, failing.set_outage, args=(None,))
+
+        finished = {}
+
+        def on_update(job):
+            if job.status in ('Complete', 'Error'): finished.setdefault(job.id, perf_counter())
+
+        engine = DownloadEngine(ctx.scratch('out'), 4, on_update=on_update, log=lambda message: None, prefetch_workers=0,
+                                skip_existing=False, transcode_workers=2,
+                                retry_policy=RetryPolicy(max_attempts=8, base_delay=0.1, max_delay=1.0, rate_limit_delay=0.2),
+                                breaker=CircuitBreaker(failure_threshold=2, cooldown=0.25, max_cooldown=1.0))
+        healthy_jobs = engine.add_many([healthy.url(name) for name in names], type='audio', format='m4a')
+        failing_jobs = engine.add_many([failing.url(name, 'localhost') for name in names[5:]], type='audio', format='m4a')
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                start = perf_counter()
+                recover.start()
+                engine.run()
+                elapsed = perf_counter() - start
+            outage_requests = failing.faults_served
+        finally:
+            recover.cancel()
+            engine.close()
+            failing.close()
+
+    permanent = healthy_jobs[4]
+    expected = [job for job in healthy_jobs + failing_jobs if job is not permanent]
+    recovered = [job for job in expected if job.status == 'Complete']
+    if permanent.status != 'Error': raise BenchmarkError(f"the 404 job ended as {permanent.status}")
+    if len(recovered) < len(expected):
+        failed = next(job for job in expected if job.status != 'Complete')
+        raise BenchmarkError(f"{len(expected) - len(recovered)} job(s) did not recover, e.g. {failed.url}: {failed.status}")
+    return {
+        'seconds': Metric(elapsed, 's', 'lower'),
+        'healthy_host_seconds': Metric(max(finished[job.id] for job in healthy_jobs) - start, 's', 'lower'),
+        'retries': Metric(sum(job.attempts - 1 for job in expected), 'retries', 'lower'),
+        'permanent_attempts': Metric(permanent.attempts, 'attempts', 'lower'),
+        'outage_requests': Metric(outage_requests, 'requests', 'lower'),
+    }
+
+@benchmark('yt_dlp', 'ffmpeg')
+def segmented(ctx):
+    """Multi-connection downloads against a server that throttles every connection: one large file over
+    1-8 byte-range connections, a queue sharing a small connection budget, and segments resuming after
+    dropped connections."""
+    per_connection = 2 * 1024 * 1024
+    source = sized_file(ctx.media_dir, 'm4a', ctx.size(16, 6) * 1024 * 1024, seconds=300)
+    size = os.path.getsize(source)
+    results = {}
+    with ctx.serve(source, 4, latency=0.02, bandwidth=per_connection) as (server, urls):
+        for segments in (1, 2, 4, 8):
+            options = {'segments': segments, 'connection_budget': 8}
+            elapsed, _ = run_queue(urls[:1], ctx.scratch('out'), workers=1, engine_options=options)
+            results[f'segments_{segments}.mb_per_sec'] = Metric(size / elapsed / 1048576, 'MB/s', 'higher')
+            results[f'segments_{segments}.per_connection_cap'] = Metric(size / elapsed / per_connection, 'x', 'higher')
+
+        # Four jobs asking for 4 connections each, with only 4 extra connections to go around
+        options = {'segments': 4, 'connection_budget': 4}
+        elapsed, _ = run_queue(urls, ctx.scratch('out'), workers=4, engine_options=options)
+        results['shared_budget.mb_per_sec'] = Metric(len(urls) * size / elapsed / 1048576, 'MB/s', 'higher')
+
+        # The first range requests are cut off halfway; each segment continues from where it stopped
+        name = os.path.basename(urls[0])
+        server.fail(name, *['truncate'] * 4)
+        server.reset_counters()
+        run_queue(urls[:1], ctx.scratch('out'), workers=1, engine_options={'segments': 4})
+        results['resume.refetched_kb'] = Metric(max(0, server.bytes_sent - size) / 1024, 'KB', 'lower')
+    return results
@@ -0,0 +1,56 @@
+"""Synthetic benchmark media generated with ffmpeg, cached by its parameters."""
+import os
+import shutil
+import subprocess
+
+# Part of every cached file name; bump it when the way media is generated changes, so old files are not reused
+MEDIA_REVISION = 2
+
+# Source encodings for generated media, keyed by file extension
+_AUDIO_CODECS = {
+    'm4a': ['-c:a', 'aac'],
+    'mp3': ['-c:a', 'libmp3lame'],
+    'wav': ['-c:a', 'pcm_s16le'],
+    'webm': ['-c:a', 'libopus'],
+}
+_VIDEO_CODECS = {
+    'mp4': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac'],
+    'mkv': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac'],
+    'webm': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8', '-c:a', 'libopus'],
+}
+
+def have_ffmpeg():
+    return bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+def audio_file(directory, ext='m4a', seconds=30, bitrate='128k'):
+    """Returns the path of a sine-tone audio file, generating it on first use."""
+    path = os.path.join(directory, f"audio-{seconds}s-{bitrate}.r{MEDIA_REVISION}.{ext}")
+    if not os.path.exists(path):
+        bitrate_args = [] if ext == 'wav' else ['-b:a', bitrate]
+        _generate(path, ['-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}']
+                  + _AUDIO_CODECS[ext] + bitrate_args)
+    return path
+
+def video_file(directory, ext='mp4', seconds=10, size='640x360', bitrate='1M'):
+    """Returns the path of a test-pattern video with a sine-tone audio track, generating it on first use."""
+    path = os.path.join(directory, f"video-{seconds}s-{size}-{bitrate}.r{MEDIA_REVISION}.{ext}")
+    if not os.path.exists(path):
+        _generate(path, ['-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={seconds}',
+                         '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+                         '-shortest', '-b:v', bitrate] + _VIDEO_CODECS[ext])
+    return path
+
+def sized_file(directory, ext, size_bytes, seconds=None):
+    """Returns the path of an audio file of roughly size_bytes, by picking the bitrate for a fixed duration."""
+    seconds = seconds or 60
+    kbps = max(8, size_bytes * 8 // seconds // 1000)
+    return audio_file(directory, ext, seconds, f'{kbps}k')
+
+def _generate(path, args):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ext = os.path.splitext(path)[1]
+    tmp = f"{path}.tmp{ext}"
+    # Index (moov atom) first, as streaming sites serve MP4, so a player can seek without reading to the end
+    faststart = ['-movflags', '+faststart'] if ext in ('.mp4', '.m4a') else []
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y'] + args + faststart + [tmp], check=True)
+    os.replace(tmp, path)
@@ -0,0 +1,188 @@
+"""Local HTTP server for benchmark media, with configurable latency, bandwidth and injected faults."""
+import collections
+import http.server
+import mimetypes
+import os
+import socket
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None # Windows: bytes are counted as they are written
+
+CHUNK_SIZE = 64 * 1024
+# Kernel send buffer of each connection; a small one keeps the data queued for a client that stops reading small
+SEND_BUFFER_SIZE = 64 * 1024
+
+def unacknowledged(sock):
+    """Bytes written to a TCP socket that the peer has not acknowledged yet, or 0 where that is unknown."""
+    if fcntl is None or not hasattr(termios, 'TIOCOUTQ'): return 0
+    try:
+        return struct.unpack('i', fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b'\0' * 4))[0]
+    except OSError:
+        return 0
+
+class MediaServer:
+    """Serves the files of a directory at http://127.0.0.1:<port>/<name> on a daemon thread.
+
+    `latency` (seconds) is added before every response and `bandwidth`
+    (bytes per second, 0 for unlimited) caps each connection. Range requests
+    are supported, so resumed and partial downloads behave as they do against
+    a real CDN. `bytes_sent` counts the body bytes the clients received since
+    the last `reset_counters`: data still queued in the kernel when a client
+    hangs up (e.g. ffmpeg seeking away) is not counted.
+
+    Faults are injected with `fail(name, *faults)`, which makes the next
+    requests for that file fail in order, and `set_outage(status)`, which
+    fails every request until it is called with None. A fault is an HTTP
+    status (429 comes with `retry_after`), "reset" (the connection is closed
+    without a response) or "truncate" (half the body, then the connection is
+    closed). `faults_served` counts the failed requests.
+    """
+    def __init__(self, directory, latency=0.0, bandwidth=0, retry_after=1):
+        self.directory = directory
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._faults = collections.defaultdict(collections.deque) # file name -> faults still to serve
+        self._outage = None
+        self.bytes_sent = 0
+        self.requests = 0
+        self.faults_served = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(handler):
+                handler.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+                super().setup()
+
+            def do_HEAD(handler):
+                server._serve(handler, head=True)
+
+            def do_GET(handler):
+                server._serve(handler, head=False)
+
+            def log_message(handler, *args):
+                pass
+
+        self._httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_port
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, name, host='127.0.0.1'):
+        """URL of a served file. Another name for the loopback address ("localhost") looks like a second host."""
+        return f"http://{host}:{self.port}/{name}"
+
+    def fail(self, name, *faults):
+        with self._lock:
+            self._faults[name].extend(faults)
+
+    def set_outage(self, status):
+        self._outage = status
+
+    def reset_counters(self):
+        with self._lock:
+            self.bytes_sent = 0
+            self.requests = 0
+            self.faults_served = 0
+
+    def _next_fault(self, name):
+        with self._lock:
+            fault = self._outage
+            if fault is None and self._faults.get(name): fault = self._faults[name].popleft()
+            if fault is not None: self.faults_served += 1
+            return fault
+
+    def _send_fault(self, handler, status):
+        handler.send_response(status)
+        if status == 429: handler.send_header('Retry-After', str(self.retry_after))
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+    def _count(self, sent=0, request=False):
+        with self._lock:
+            self.bytes_sent += sent
+            if request: self.requests += 1
+
+    def _serve(self, handler, head):
+        self._count(request=True)
+        if self.latency: time.sleep(self.latency)
+        name = os.path.basename(handler.path.split('?')[0])
+        path = os.path.join(self.directory, name)
+        fault = self._next_fault(name)
+        if fault == 'reset':
+            handler.close_connection = True
+            return
+        if isinstance(fault, int):
+            self._send_fault(handler, fault)
+            return
+        if not os.path.isfile(path):
+            handler.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        range_header = handler.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            first, _, last = range_header[6:].split(',')[0].partition('-')
+            if first:
+                start, end = int(first), int(last) if last else size - 1
+            elif last:
+                start = max(0, size - int(last))
+            end = min(end, size - 1)
+            if start >= size:
+                handler.send_response(416)
+                handler.send_header('Content-Range', f'bytes */{size}')
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            handler.send_response(206)
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            handler.send_response(200)
+        length = end - start + 1
+        handler.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        handler.send_header('Content-Length', str(length))
+        handler.send_header('Accept-Ranges', 'bytes')
+        handler.end_headers()
+        if head: return
+        if fault == 'truncate':
+            # Promise the full length, deliver half of it and hang up
+            length = max(1, length // 2)
+            handler.close_connection = True
+
+        began = time.monotonic()
+        sent = counted = 0
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                while sent < length:
+                    chunk = f.read(min(CHUNK_SIZE, length - sent))
+                    if not chunk: break
+                    handler.wfile.write(chunk)
+                    sent += len(chunk)
+                    # Count what the client has acknowledged so far
+                    received = sent - unacknowledged(handler.connection)
+                    if received > counted:
+                        self._count(received - counted)
+                        counted = received
+                    if self.bandwidth:
+                        # Sleep until this connection is back under its byte budget
+                        ahead = sent / self.bandwidth - (time.monotonic() - began)
+                        if ahead > 0: time.sleep(ahead)
+            # The whole body was handed over; the rest arrives unless the client hangs up first
+            self._count(sent - counted)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
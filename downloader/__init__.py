@@ -0,0 +1,14 @@
+"""Headless media download engine used by the mp3.py GUI and command line."""
+from .engine import (
+    AUDIO_FORMATS,
+    VIDEO_FORMATS,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PER_HOST_LIMIT,
+    Job,
+    DownloadEngine,
+    DownloadWorkerPool,
+    build_ydl_opts,
+    job_host,
+)
+from .jobstore import JobStore
+from .journal import QueueJournal
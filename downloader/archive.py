@@ -0,0 +1,103 @@
+"""Download archive and output-directory index, used to skip media that was already fetched."""
+import functools
+import os
+import threading
+
+_extractor_classes = None
+_extractor_lock = threading.Lock()
+
+def archive_key(extractor, media_id, job_type, job_format, section=''):
+    """Returns the archive entry for a media item in a given target type and format (and trim section, if any)."""
+    key = f"{extractor.lower()} {media_id} {job_type} {job_format}"
+    return f"{key} {section}" if section else key
+
+def info_media_id(info):
+    """Returns (extractor, media id) from a yt-dlp info dict, or None."""
+    extractor = info.get('extractor_key') or info.get('ie_key') or info.get('extractor')
+    media_id = info.get('id')
+    if not extractor or not media_id: return None
+    return extractor, str(media_id)
+
+@functools.lru_cache(maxsize=4096)
+def url_media_id(url):
+    """Returns (extractor, media id) for a URL without any network I/O, or None if it cannot be told from the URL."""
+    global _extractor_classes
+    with _extractor_lock:
+        if _extractor_classes is None:
+            from yt_dlp.extractor import gen_extractor_classes
+            # The generic extractor matches everything and has no stable id
+            _extractor_classes = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+    for ie in _extractor_classes:
+        try:
+            if not ie.suitable(url): continue
+            media_id = ie.get_temp_id(url) if hasattr(ie, 'get_temp_id') else ie._match_id(url)
+        except Exception:
+            return None
+        return (ie.ie_key(), str(media_id)) if media_id else None
+    return None
+
+def expected_filename(title, job_format, suffix=''):
+    """Returns the file name the '%(title)s.%(ext)s' template (plus an optional suffix) produces for a finished job."""
+    from yt_dlp.utils import sanitize_filename
+    return f"{sanitize_filename(title)}{suffix}.{job_format}"
+
+class DownloadArchive:
+    """Persistent set of archive keys, stored one per line in an append-only text file.
+
+    The whole file is loaded into a set once, so a lookup is O(1) regardless of
+    how many entries the archive holds.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._keys = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._keys.update(line.strip() for line in f if line.strip())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def add(self, key):
+        with self._lock:
+            if key in self._keys: return
+            self._keys.add(key)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(key + '\n')
+
+class OutputIndex:
+    """Set of file names present in the output directory.
+
+    Built with one directory scan and kept up to date as jobs finish. `refresh`
+    only rescans when the directory's modification time has changed.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._names = set()
+        self._mtime = None
+        self.refresh()
+
+    def refresh(self):
+        """Rescans the directory if it changed since the last scan."""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime: return
+        with os.scandir(self.directory) as entries:
+            names = {os.path.normcase(entry.name) for entry in entries if entry.is_file()}
+        with self._lock:
+            self._names = names
+            self._mtime = mtime
+
+    def __contains__(self, name):
+        return os.path.normcase(name) in self._names
+
+    def add(self, path):
+        """Records a file written into the directory."""
+        with self._lock:
+            self._names.add(os.path.normcase(os.path.basename(path)))
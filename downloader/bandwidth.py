@@ -0,0 +1,111 @@
+"""Shared bandwidth control: token buckets that throttle downloads from their progress hooks."""
+import re
+import threading
+import time
+
+# yt-dlp's HTTP downloader grows its read size up to several MB; while a cap is in
+# effect a fixed, small block keeps the throttling smooth instead of bursty
+THROTTLED_BUFFER_SIZE = 64 * 1024
+
+# Unused capacity carries over for at most this many seconds
+DEFAULT_BURST = 0.5
+
+_RATE_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?$', re.IGNORECASE)
+_RATE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+def parse_rate(text):
+    """Parses a rate such as "500K", "2M", "1.5 MB/s" or a plain number of bytes per second.
+
+    Returns bytes per second; blank, "0" and "unlimited" give 0 (no cap). Raises ValueError.
+    """
+    text = str(text or '').strip()
+    if not text or text.lower() == 'unlimited': return 0
+    match = _RATE_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid rate '{text}', expected e.g. 500K or 2M")
+    number, unit = match.groups()
+    return int(float(number) * _RATE_UNITS[unit.lower()])
+
+def format_rate(rate):
+    """Formats bytes per second for display, e.g. "512 KB/s"; 0 is "Unlimited"."""
+    if not rate: return "Unlimited"
+    for unit, size in (('GB', 1024 ** 3), ('MB', 1024 ** 2), ('KB', 1024)):
+        if rate >= size: return f"{rate / size:g} {unit}/s"
+    return f"{rate} B/s"
+
+class TokenBucket:
+    """Rate limiter shared by any number of threads; `rate` is in bytes per second, 0 means unlimited.
+
+    `consume(n)` blocks the calling thread until n more bytes fit under the
+    rate, so every thread charging the same bucket shares one budget. The
+    rate can be changed at any time with `set_rate`; threads that are
+    already waiting are re-scheduled at the new rate.
+    """
+    def __init__(self, rate=0, burst=DEFAULT_BURST):
+        self.burst = burst
+        self._cond = threading.Condition()
+        self._rate = max(0, int(rate or 0))
+        self._next_free = time.monotonic() # when the bytes handed out so far are paid for
+        self._generation = 0
+        self._changed_at = self._next_free
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        with self._cond:
+            self._rate = max(0, int(rate or 0))
+            self._changed_at = self._next_free = time.monotonic()
+            self._generation += 1
+            self._cond.notify_all()
+
+    def consume(self, n):
+        """Charges n bytes to the bucket, sleeping as long as the rate requires."""
+        with self._cond:
+            while n > 0 and self._rate:
+                rate = self._rate
+                now = time.monotonic()
+                self._next_free = max(self._next_free, now - self.burst) + n / rate
+                deadline = self._next_free
+                if deadline <= now: return
+                generation = self._generation
+                self._cond.wait(deadline - now)
+                if self._generation == generation: return
+                # The rate changed while waiting: charge the bytes not yet paid for at the new rate
+                n = min(n, max(0.0, (deadline - self._changed_at) * rate))
+
+class JobThrottle:
+    """Charges the bytes a download reports through its progress hook to one or more buckets.
+
+    yt-dlp reports cumulative `downloaded_bytes` per file; the difference since
+    the last report is what gets charged. The first report of a file only sets
+    the starting point: a resumed download counts the bytes already on disk,
+    which were not transferred now and must not hold up other downloads.
+    Sleeping in the hook holds back the download thread, which is what limits
+    the transfer rate. Concurrent fragment and segment downloads report from
+    several threads, hence the lock; a report older than one already charged
+    carries nothing new.
+    """
+    __slots__ = ('buckets', '_seen', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._seen = None # downloaded_bytes charged so far, None until the file's first report
+        self._lock = threading.Lock()
+
+    def update(self, d):
+        with self._lock:
+            if d.get('status') != 'downloading':
+                # The next file (e.g. the audio stream of a video) starts counting afresh
+                self._seen = None
+                return
+            downloaded = d.get('downloaded_bytes') or 0
+            if self._seen is None:
+                # yt-dlp does not report the resume offset; only the file's first read goes uncharged
+                self._seen = downloaded
+                return
+            delta = downloaded - self._seen
+            self._seen = max(self._seen, downloaded)
+        if delta <= 0: return
+        for bucket in self.buckets: bucket.consume(delta)
@@ -0,0 +1,27 @@
+"""Thread-safe, coalescing hand-off from worker threads to a UI thread."""
+import threading
+
+class LatestValueChannel:
+    """Keeps only the newest value posted for each key until the consumer drains it.
+
+    Workers call `post` as often as they like; the UI thread calls `drain` at a
+    fixed frame rate and gets at most one value per key, in first-posted order.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.posted = 0
+        self.drained = 0
+
+    def post(self, key, value):
+        with self._lock:
+            self._pending[key] = value
+            self.posted += 1
+
+    def drain(self):
+        """Returns the pending (key, value) pairs and empties the channel."""
+        with self._lock:
+            if not self._pending: return []
+            pending, self._pending = self._pending, {}
+        self.drained += len(pending)
+        return list(pending.items())
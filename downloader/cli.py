@@ -0,0 +1,156 @@
+"""Command line / batch mode for the download engine.
+
+Examples:
+    python mp3.py --batch urls.txt --type audio --format mp3 -j 8 --out DIR
+    some-command | python mp3.py --batch - --batch-format json
+"""
+import argparse
+import itertools
+import sys
+from contextlib import nullcontext
+
+from .engine import AUDIO_FORMATS, VIDEO_FORMATS, DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST_LIMIT, DownloadEngine, parse_trim
+from .archive import DownloadArchive
+from .bandwidth import parse_rate
+from .importer import IMPORT_FORMATS, open_source, read_urls
+from .journal import QueueJournal
+from .metadata import DEFAULT_PREFETCH_WORKERS
+from .metrics import MetricsRecorder, MetricsServer, QueueProfiler
+from .playlist import parse_date
+from .retry import DEFAULT_BASE_DELAY, DEFAULT_MAX_ATTEMPTS, RetryPolicy
+from .segmented import DEFAULT_CONNECTION_BUDGET, DEFAULT_SEGMENTS
+from .sessions import ffmpeg_capabilities
+from .transcode import DEFAULT_TRANSCODE_WORKERS
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='mp3.py',
+        description="All-in-One Media Downloader. Run without arguments to open the GUI.",
+    )
+    parser.add_argument('urls', nargs='*', help="URLs to download")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="import URLs from a text (one per line), CSV or JSON file; '-' for stdin. "
+                             "Duplicates of queued media are skipped")
+    parser.add_argument('--batch-format', choices=('auto',) + IMPORT_FORMATS, default='auto',
+                        help="format of the --batch input (default: from the file name or its contents)")
+    parser.add_argument('--type', choices=['audio', 'video'], default='audio', help="download type (default: audio)")
+    parser.add_argument('--format', help=f"output format; audio: {', '.join(AUDIO_FORMATS)}, video: {', '.join(VIDEO_FORMATS)}")
+    parser.add_argument('--start', default='', metavar='HH:MM:SS', help="trim start time")
+    parser.add_argument('--end', default='', metavar='HH:MM:SS', help="trim end time")
+    parser.add_argument('--playlist', action='store_true',
+                        help="expand playlist/channel URLs into one job per item, streaming them into the queue")
+    parser.add_argument('--playlist-start', type=int, default=1, metavar='N', help="first playlist item to queue (1-based)")
+    parser.add_argument('--playlist-end', type=int, default=None, metavar='N', help="last playlist item to queue")
+    parser.add_argument('--max-items', type=int, default=None, metavar='N', help="queue at most N items per playlist")
+    parser.add_argument('--date-after', metavar='YYYYMMDD', help="only queue playlist items uploaded on or after this date")
+    parser.add_argument('--date-before', metavar='YYYYMMDD', help="only queue playlist items uploaded on or before this date")
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_MAX_WORKERS, help=f"parallel downloads (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST_LIMIT, help="max parallel downloads per host, 0 = no limit")
+    parser.add_argument('-r', '--limit-rate', default='0', metavar='RATE',
+                        help="cap on the combined bandwidth of all downloads, e.g. 500K or 2M (default: no cap)")
+    parser.add_argument('--job-limit-rate', default='0', metavar='RATE', help="cap on the bandwidth of each single download")
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, metavar='N',
+                        help=f"connections per download: byte ranges of direct files, HLS/DASH fragments at once, "
+                             f"1 = single connection (default: {DEFAULT_SEGMENTS})")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTION_BUDGET, metavar='N',
+                        help=f"extra connections shared by all running downloads, on top of one each "
+                             f"(default: {DEFAULT_CONNECTION_BUDGET})")
+    parser.add_argument('--attempts', type=int, default=DEFAULT_MAX_ATTEMPTS, metavar='N',
+                        help=f"download attempts per job for timeouts, 5xx and 429 errors, 1 = no retries (default: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument('--retry-delay', type=float, default=DEFAULT_BASE_DELAY, metavar='SECONDS',
+                        help=f"delay before the first retry, doubling with every attempt (default: {DEFAULT_BASE_DELAY:g})")
+    parser.add_argument('-o', '--out', default=None, metavar='DIR', help="output directory (default: current directory)")
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH_WORKERS, metavar='N',
+                        help=f"parallel metadata lookups ahead of the downloads, 0 = off (default: {DEFAULT_PREFETCH_WORKERS})")
+    parser.add_argument('--transcode-workers', type=int, default=DEFAULT_TRANSCODE_WORKERS, metavar='N',
+                        help=f"parallel ffmpeg conversions (default: {DEFAULT_TRANSCODE_WORKERS}, the number of cores)")
+    parser.add_argument('--journal', metavar='FILE', help="persist the queue in FILE and resume its unfinished jobs first")
+    parser.add_argument('--archive', metavar='FILE', help="skip media listed in FILE and record finished downloads in it")
+    parser.add_argument('--no-skip-existing', dest='skip_existing', action='store_false',
+                        help="download even if the output file already exists")
+    parser.add_argument('--metrics', metavar='FILE', help="append per-job timings and throughput to FILE as JSON lines")
+    parser.add_argument('--prometheus', metavar='FILE', help="keep queue totals in FILE in Prometheus text format")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', help="serve queue totals at http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--profile', metavar='FILE', help="profile the download workers with cProfile and save the stats to FILE")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print the final summary and errors")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    formats = AUDIO_FORMATS if args.type == 'audio' else VIDEO_FORMATS
+    if args.format and args.format not in formats:
+        parser.error(f"--format must be one of {', '.join(formats)} for {args.type}")
+    try:
+        parse_trim(args.start, args.end)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        parse_date(args.date_after)
+        parse_date(args.date_before)
+        rate_limit, job_rate_limit = parse_rate(args.limit_rate), parse_rate(args.job_limit_rate)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not args.urls and not args.batch and not args.journal:
+        parser.error("no URLs given; pass URLs or --batch FILE")
+
+    def on_update(job):
+        # Per-tick progress is too noisy for a log; report only state changes
+        if not args.quiet and not job.status.startswith('Downloading '):
+            print(f"[{job.id}] {job.status}: {job.url}", flush=True)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    if not ffmpeg_capabilities():
+        log("Warning: FFmpeg not found; downloads cannot be converted.")
+
+    journal = QueueJournal(args.journal) if args.journal else None
+    metrics = MetricsRecorder(args.metrics, args.prometheus)
+    server = MetricsServer(metrics, args.metrics_port) if args.metrics_port else None
+    profiler = QueueProfiler() if args.profile else None
+    engine = DownloadEngine(args.out, args.jobs, args.per_host, on_update=on_update, log=log, journal=journal,
+                            prefetch_workers=args.prefetch,
+                            archive=DownloadArchive(args.archive) if args.archive else None,
+                            skip_existing=args.skip_existing,
+                            transcode_workers=args.transcode_workers,
+                            rate_limit=rate_limit,
+                            metrics=metrics,
+                            profiler=profiler,
+                            retry_policy=RetryPolicy(args.attempts, args.retry_delay),
+                            segments=args.segments,
+                            connection_budget=args.connections,
+                            quiet=args.quiet)
+    try:
+        restored = engine.restore()
+        if restored and not args.quiet: print(f"Resuming {len(restored)} unfinished job(s) from {args.journal}")
+        options = dict(type=args.type, format=args.format, start_time=args.start, end_time=args.end, rate_limit=job_rate_limit)
+        try:
+            with open_source(args.batch) if args.batch else nullcontext() as stream:
+                urls = args.urls
+                # The batch input is streamed into the queue, never read into memory as a whole
+                if stream: urls = itertools.chain(urls, read_urls(stream, args.batch_format, args.batch))
+                if args.playlist:
+                    for url in urls:
+                        engine.add_playlist(url, **options, start=args.playlist_start, end=args.playlist_end,
+                                            limit=args.max_items, date_after=args.date_after, date_before=args.date_before)
+                else:
+                    imported = engine.import_urls(urls, **options)
+                    if imported.duplicates and not args.quiet:
+                        print(f"Queued {imported.added} URL(s), skipped {imported.duplicates} duplicate(s)")
+        except (OSError, ValueError) as e:
+            # Whatever was read before the error stays queued
+            log(f"Error reading {args.batch}: {e}")
+            if not engine.jobs and not engine.expanding(): return 1
+        jobs = engine.run()
+    finally:
+        engine.close()
+        if server: server.close()
+        if profiler and profiler.dump(args.profile): log(f"Profile saved to {args.profile}")
+
+    failed = [job for job in jobs if job.status == 'Error']
+    skipped = [job for job in jobs if job.status == 'Skipped']
+    print(f"Finished: {len(jobs) - len(failed) - len(skipped)} complete, {len(skipped)} skipped, {len(failed)} failed.")
+    return 1 if failed else 0
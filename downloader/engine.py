@@ -0,0 +1,817 @@
+"""GUI-free download engine: the job model, yt-dlp option building and the queue runner.
+
+Nothing in here imports tkinter, and yt_dlp is only imported once a job actually
+starts downloading, so the engine can be used from scripts and headless boxes.
+"""
+import copy
+import os
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from .archive import OutputIndex, archive_key, expected_filename, info_media_id, url_media_id
+from .bandwidth import THROTTLED_BUFFER_SIZE, JobThrottle, TokenBucket
+from .importer import IMPORT_BATCH_SIZE, IMPORT_PREFETCH, ImportResult, media_key
+from .jobstore import JobStore
+from .logs import job_context
+from .metadata import DEFAULT_PREFETCH_WORKERS, InfoCache, MetadataPrefetcher, estimate_size, normalize_url
+from .metrics import MetricsRecorder
+from .playlist import PlaylistExpander, date_in_range, entry_date, entry_url
+from .retry import PERMANENT, RATE_LIMITED, CircuitBreaker, RetryPolicy, classify_error
+from .segmented import DEFAULT_CONNECTION_BUDGET, DEFAULT_SEGMENTS, ConnectionBudget, SegmentedDownloader
+from .sessions import SessionPool
+from .transcode import DEFAULT_TRANSCODE_WORKERS, TranscodeStage
+
+AUDIO_FORMATS = ['mp3', 'wav', 'm4a']
+VIDEO_FORMATS = ['mp4', 'mkv', 'webm']
+
+# Default worker pool sizing for the download queue
+DEFAULT_MAX_WORKERS = 3
+DEFAULT_PER_HOST_LIMIT = 0 # 0 means no per-host cap
+
+# Statuses of jobs that are done, as opposed to Pending or in flight
+FINISHED_STATUSES = ('Complete', 'Skipped', 'Error')
+
+# A job that failed for a transient reason waits in this status until its retry is due
+RETRY_STATUS = 'Waiting to retry'
+# Statuses of jobs the worker pool may still start
+QUEUED_STATUSES = ('Pending', RETRY_STATUS)
+
+def job_host(url):
+    """Returns the lower-cased host name of a job URL, used for per-host limits."""
+    try:
+        return (urlsplit(url.strip()).hostname or '').lower()
+    except ValueError:
+        return ''
+
+_TIMESTAMP_RE = re.compile(r'^(?:(?:(\d+):)?(\d{1,2}):)?(\d+(?:\.\d+)?)$')
+
+def parse_timestamp(text):
+    """Parses "HH:MM:SS", "MM:SS" or "SS" (seconds may have a fraction) into seconds. Raises ValueError."""
+    match = _TIMESTAMP_RE.match(text.strip())
+    if not match:
+        raise ValueError(f"Invalid time '{text.strip()}', expected HH:MM:SS")
+    hours, minutes, seconds = match.groups()
+    if minutes is not None and (int(minutes) >= 60 or float(seconds) >= 60):
+        raise ValueError(f"Invalid time '{text.strip()}', minutes and seconds must be below 60")
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+def parse_trim(start_time, end_time):
+    """Validates a trim range. Returns (start, end) in seconds, either may be None. Raises ValueError."""
+    start = parse_timestamp(start_time) if start_time.strip() else None
+    end = parse_timestamp(end_time) if end_time.strip() else None
+    if start is not None and end is not None and end <= start:
+        raise ValueError("End time must be after start time")
+    return start, end
+
+def section_label(start_time, end_time):
+    """File-name safe label of a trim range, e.g. "30s-90s", or "" when it is not trimmed."""
+    if not (start_time or end_time): return ""
+    start, end = parse_trim(start_time, end_time)
+    return f"{start or 0.0:g}s-{'end' if end is None else f'{end:g}s'}"
+
+def default_format(job_type):
+    """Returns the default output format for a job type."""
+    return AUDIO_FORMATS[0] if job_type == 'audio' else VIDEO_FORMATS[0]
+
+class Job:
+    """A single queued download and its current state."""
+    __slots__ = ('id', 'seq', 'url', 'type', 'format', 'start_time', 'end_time', 'status', 'progress',
+                 'priority', 'rate_limit', 'date_after', 'date_before', 'title', 'duration', 'filesize', 'attempts',
+                 'retry_at')
+
+    def __init__(self, id, url, type='audio', format=None, start_time='', end_time='', status='Pending', progress=0.0, seq=0,
+                 priority=0, rate_limit=0, date_after=None, date_before=None):
+        self.id = id
+        self.seq = seq
+        # Higher priorities start first; equal priorities run in queue order
+        self.priority = priority or 0
+        # Per-job bandwidth cap in bytes per second, 0 for none
+        self.rate_limit = rate_limit or 0
+        # Upload date range (YYYYMMDD, inclusive) of the playlist filter the job was queued under
+        self.date_after = date_after or None
+        self.date_before = date_before or None
+        self.url = url
+        self.type = type
+        self.format = format or default_format(type)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.status = status
+        self.progress = progress
+        # Filled in by the metadata prefetch stage
+        self.title = None
+        self.duration = None
+        self.filesize = None
+        # Download attempts so far, and the monotonic time before which a retry must not start
+        self.attempts = 0
+        self.retry_at = 0.0
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.url!r}, {self.type!r}, {self.format!r}, status={self.status!r})"
+
+    @property
+    def trim_label(self):
+        """Human readable trim range, or "Full" when the job is not trimmed."""
+        if self.start_time or self.end_time:
+            return f"{self.start_time} - {self.end_time}"
+        return "Full"
+
+    @property
+    def section(self):
+        """The trimmed (start, end) range in seconds, or None for a full download. End may be infinite."""
+        if not (self.start_time or self.end_time): return None
+        start, end = parse_trim(self.start_time, self.end_time)
+        return (start or 0.0, float('inf') if end is None else end)
+
+    @property
+    def section_label(self):
+        """File-name safe label of the trimmed range, e.g. "30s-90s", or "" for a full download."""
+        return section_label(self.start_time, self.end_time)
+
+    def apply_info(self, info):
+        """Copies display metadata (title, duration, size) from a yt-dlp info dict."""
+        self.title = info.get('title') or self.title
+        self.duration = info.get('duration') or self.duration
+        self.filesize = estimate_size(info, self.type) or self.filesize
+
+    def set_type(self, job_type):
+        """Switches between audio and video, resetting the format to that type's default."""
+        self.type = job_type
+        self.format = default_format(job_type)
+
+def format_selector(job):
+    """Returns the yt-dlp format selection for a job, preferring sources that need no re-encoding."""
+    if job.type == 'audio':
+        preferred = {'m4a': 'bestaudio[ext=m4a]/', 'mp3': 'bestaudio[acodec=mp3]/'}.get(job.format, '')
+        return f'{preferred}bestaudio/best'
+    if job.format == 'webm':
+        return 'bestvideo[ext=webm]+bestaudio[ext=webm]/best[ext=webm]/bestvideo+bestaudio/best'
+    if job.format == 'mp4':
+        return 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/bestvideo+bestaudio/best'
+    return 'bestvideo+bestaudio/best'
+
+def build_ydl_opts(job, directory, progress_hook=None, throttled=False, postprocessor_hook=None):
+    """Builds the yt-dlp options for the download stage of a job.
+
+    Conversion to the job's format is not part of these options; the
+    transcode stage (see transcode.TranscodeStage) does it afterwards.
+    With `throttled`, reads use a small fixed block size so the bandwidth
+    limits applied from the progress hook stay smooth.
+    """
+    section = job.section
+    name = f'%(title)s [{job.section_label}].%(ext)s' if section else '%(title)s.%(ext)s'
+    ydl_opts = {
+        'outtmpl': os.path.join(directory, name),
+        'noplaylist': True,
+        'progress_hooks': [progress_hook] if progress_hook else [],
+        'postprocessor_hooks': [postprocessor_hook] if postprocessor_hook else [],
+        'noprogress': True,
+        # Keep .part files and continue them, so interrupted jobs resume instead of restarting
+        'continuedl': True,
+        'nopart': False,
+    }
+    if throttled:
+        ydl_opts['buffersize'] = THROTTLED_BUFFER_SIZE
+        ydl_opts['noresizebuffer'] = True
+
+    if job.date_after or job.date_before:
+        # For jobs queued without a listed date; yt-dlp skips the download when the upload date is out of range
+        from yt_dlp.utils import DateRange
+        ydl_opts['daterange'] = DateRange(job.date_after, job.date_before)
+
+    if section:
+        # Fetch only the requested range: yt-dlp hands sections to ffmpeg, which seeks on the
+        # input side, instead of downloading the whole media and cutting it afterwards. ffmpeg
+        # stream-copies from the keyframe before the start; the transcode stage makes the cut exact
+        from yt_dlp.utils import download_range_func
+        ydl_opts['download_ranges'] = download_range_func(None, [section])
+
+    ydl_opts['format'] = format_selector(job)
+    if job.type == 'video':
+        # Merge into the requested container when the codecs allow it, otherwise into mkv,
+        # which takes anything; the transcode stage then converts only what does not fit
+        ydl_opts['merge_output_format'] = job.format if job.format == 'mkv' else f'{job.format}/mkv'
+    return ydl_opts
+
+def downloaded_path(info):
+    """Returns the path of the file yt-dlp wrote for a processed info dict, or None."""
+    if not info: return None
+    downloads = info.get('requested_downloads') or [info]
+    return downloads[-1].get('filepath') or info.get('filepath') or info.get('_filename')
+
+class DownloadWorkerPool:
+    """Runs Pending jobs from a queue on a fixed number of worker threads.
+
+    Each worker claims the next Pending job whose host is below the per-host
+    cap and hands it to `run_job`; higher job priorities go first, equal
+    priorities in queue order. `run` blocks until the whole queue drains.
+    Jobs added to the queue while it runs are picked up as well; while
+    `more_coming()` returns True, idle workers wait for them instead of exiting.
+    Jobs handed back with `requeue` wait until their `retry_at`, and with a
+    `breaker` (retry.CircuitBreaker) jobs for a host whose circuit is open
+    wait for it to cool down, while jobs for other hosts keep running.
+    """
+    def __init__(self, jobs, run_job, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 more_coming=None, breaker=None):
+        self.jobs = jobs
+        self.more_coming = more_coming
+        self.breaker = breaker
+        self.run_job = run_job
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(0, int(per_host_limit))
+        self._cond = threading.Condition()
+        self._claimed = set()
+        self._active_hosts = {}
+        self._candidates = deque()
+        self._added = False # jobs were added since the candidates were collected
+
+    def _refill(self):
+        """Collects the unclaimed queued jobs. Each job is scanned once per pass, not once per claim."""
+        self._added = False
+        pending = [job for job in self.jobs if job.status in QUEUED_STATUSES and job.id not in self._claimed]
+        # Stable sort: queue order is kept among jobs of the same priority
+        pending.sort(key=lambda job: -job.priority)
+        self._candidates = deque(pending)
+
+    def _take_runnable(self):
+        """Pops the first candidate that may start now.
+
+        Returns (job, host, blocked, wake_at): blocked is True if a job waits
+        for a slot on a busy host, wake_at the earliest time a job waiting
+        for its retry or for a host to cool down becomes runnable (or None).
+        """
+        blocked, wake_at, now = False, None, time.monotonic()
+        for index, job in enumerate(self._candidates):
+            if job.status not in QUEUED_STATUSES or job.id in self._claimed: continue
+            if job.retry_at > now:
+                wake_at = min(wake_at or job.retry_at, job.retry_at)
+                continue
+            host = job_host(job.url)
+            if self.per_host_limit and self._active_hosts.get(host, 0) >= self.per_host_limit:
+                blocked = True
+                continue
+            if self.breaker and not self.breaker.allow(host):
+                # Open circuit; a half-open one waits for its probe job, which a release wakes us from
+                until = self.breaker.open_until(host)
+                if until is not None and until > now: wake_at = min(wake_at or until, until)
+                else: blocked = True
+                continue
+            del self._candidates[index]
+            return job, host, blocked, wake_at
+        # Nothing runnable: keep only the jobs that are still waiting on a busy host, a retry or a cooldown
+        self._candidates = deque(job for job in self._candidates if job.status in QUEUED_STATUSES and job.id not in self._claimed)
+        return None, None, blocked, wake_at
+
+    def _claim_next(self):
+        """Returns (job, host) for the next runnable job, or (None, None) once nothing is left."""
+        with self._cond:
+            while True:
+                job, host, blocked, wake_at = self._take_runnable()
+                if job is None and (self._added or not (blocked or wake_at)):
+                    self._refill()
+                    job, host, blocked, wake_at = self._take_runnable()
+                if job is not None:
+                    self._claimed.add(job.id)
+                    self._active_hosts[host] = self._active_hosts.get(host, 0) + 1
+                    return job, host
+                if wake_at:
+                    # Jobs are waiting for a retry or a host cooldown; sleep until the first one is due
+                    self._cond.wait(timeout=max(0.0, wake_at - time.monotonic()))
+                    continue
+                if not blocked:
+                    if not (self.more_coming and self.more_coming()): return None, None
+                    # The queue is still being filled (e.g. a playlist is being listed); wait for new jobs
+                    self._cond.wait(timeout=1.0)
+                    continue
+                # Every remaining job is waiting on a busy host; sleep until a slot frees up
+                self._cond.wait()
+
+    def wake(self):
+        """Wakes idle workers after jobs were added to the queue."""
+        with self._cond:
+            self._added = True
+            self._cond.notify_all()
+
+    def requeue(self, job):
+        """Hands a claimed job back to the queue, to run again once its `retry_at` has passed."""
+        with self._cond:
+            self._claimed.discard(job.id)
+            self._candidates.append(job)
+            self._cond.notify_all()
+
+    def reschedule(self):
+        """Drops the collected candidates so the next claim re-reads priorities and queue order."""
+        with self._cond:
+            self._candidates.clear()
+            self._cond.notify_all()
+
+    def _release(self, host):
+        with self._cond:
+            self._active_hosts[host] -= 1
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            job, host = self._claim_next()
+            if job is None: return
+            try:
+                self.run_job(job)
+            finally:
+                self._release(host)
+
+    def run(self):
+        """Starts the workers and blocks until every Pending job has been processed."""
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.max_workers)]
+        for worker in workers: worker.start()
+        for worker in workers: worker.join()
+
+class DownloadEngine:
+    """Owns the download queue and runs it on a worker pool.
+
+    `on_update(job)` is called from worker threads whenever a job's status or
+    progress changes; `log(message)` receives engine messages (defaults to print).
+    With a `journal` (see journal.QueueJournal) every change to the queue is
+    persisted and `restore` brings back unfinished jobs after a restart.
+    Downloaded files are converted on a separate pool of `transcode_workers`
+    ffmpeg processes, so the next download starts while the last one converts.
+    With `prefetch_workers` > 0, metadata for new jobs is extracted in the
+    background as soon as they are queued and reused by the download stage.
+    Jobs found in the `archive` (see archive.DownloadArchive) or whose output
+    file already exists (with `skip_existing`) are marked Skipped without
+    being downloaded. `rate_limit` caps the combined bandwidth of all
+    running downloads (bytes per second, 0 for none); each job can carry a
+    cap of its own on top, and both can be changed while the queue runs.
+    Phase timings and throughput of every job go to `metrics` (see
+    metrics.MetricsRecorder); with `profiler` (metrics.QueueProfiler) the
+    download workers run under cProfile. Failed downloads are classified
+    (see retry.classify_error): transient and rate-limited ones are queued
+    again with backoff by `retry_policy`, and `breaker` cools down hosts that
+    keep failing; permanent failures end in Error right away. A download may
+    use up to `segments` connections (byte ranges of direct files, concurrent
+    HLS/DASH fragments, see segmented.SegmentedDownloader); the ones beyond
+    its first come from `connection_budget`, shared by all running downloads.
+    With `quiet`, yt-dlp's own messages are not printed; errors still reach `log`.
+    """
+    def __init__(self, output_dir=None, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 on_update=None, log=print, journal=None, prefetch_workers=DEFAULT_PREFETCH_WORKERS,
+                 archive=None, skip_existing=True, transcode_workers=DEFAULT_TRANSCODE_WORKERS, rate_limit=0,
+                 metrics=None, profiler=None, retry_policy=None, breaker=None, segments=DEFAULT_SEGMENTS,
+                 connection_budget=DEFAULT_CONNECTION_BUDGET, quiet=False):
+        self.output_dir = output_dir or os.getcwd()
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.on_update = on_update
+        self.log = log
+        self.journal = journal
+        self.archive = archive
+        self.skip_existing = skip_existing
+        self.transcode_workers = transcode_workers
+        self.transcoder = None
+        self.output_index = None
+        self.sessions = SessionPool(quiet=quiet)
+        self.bandwidth = TokenBucket(rate_limit)
+        self.metrics = metrics or MetricsRecorder()
+        self.profiler = profiler
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.connections = ConnectionBudget(connection_budget)
+        self.segmenter = SegmentedDownloader(self.connections, segments)
+        self._job_buckets = {} # job id -> TokenBucket of a running job with its own cap
+        self.jobs = JobStore()
+        self.info_cache = InfoCache()
+        self.prefetcher = None
+        self._awaiting_info = {} # normalized url -> jobs waiting for prefetched metadata
+        self._awaiting_lock = threading.Lock()
+        if prefetch_workers > 0:
+            self.prefetcher = MetadataPrefetcher(self.info_cache, prefetch_workers, self._info_ready, log)
+        self.job_counter = 0
+        self._add_lock = threading.Lock()
+        self._expanders = set()
+        self._pool = None
+        self.is_running = False
+
+    def add(self, url, type='audio', format=None, start_time='', end_time='', priority=0, rate_limit=0, prefetch=True):
+        """Appends a new Pending job to the queue and returns it. Raises ValueError for an invalid trim range."""
+        parse_trim(start_time, end_time)
+        with self._add_lock:
+            job = self._new_job(url, type, format, start_time, end_time, priority, rate_limit)
+            self.jobs.add(job)
+        self.metrics.job_added(job)
+        self.job_changed(job)
+        if priority: self._reschedule()
+        if prefetch: self.prefetch(job)
+        return job
+
+    def _new_job(self, url, type, format, start_time, end_time, priority, rate_limit):
+        """Numbers and builds a job; the caller holds _add_lock."""
+        self.job_counter += 1
+        return Job(f'job_{self.job_counter}', url.strip(), type, format, start_time.strip(), end_time.strip(), seq=self.job_counter,
+                   priority=priority, rate_limit=rate_limit)
+
+    def import_urls(self, urls, type='audio', format=None, start_time='', end_time='', priority=0, rate_limit=0,
+                    batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+        """Queues URLs from any iterable (e.g. importer.read_urls over a file), skipping duplicates.
+
+        URLs are compared by canonical media key (see importer.media_key), with
+        each other and with the queued jobs of the same type, format and trim.
+        Jobs are added `batch_size` at a time and each batch is passed to
+        `on_batch(jobs)`; only the first IMPORT_PREFETCH get their metadata
+        prefetched. Returns ImportResult(added, duplicates). Raises ValueError
+        for an invalid trim range.
+        """
+        parse_trim(start_time, end_time)
+        format = format or default_format(type)
+        section = section_label(start_time.strip(), end_time.strip())
+        seen = {media_key(job.url) for job in self.jobs
+                if (job.type, job.format, job.section_label) == (type, format, section)}
+        added = duplicates = 0
+        batch = []
+
+        def flush():
+            with self._add_lock:
+                jobs = [self._new_job(url, type, format, start_time, end_time, priority, rate_limit) for url in batch]
+                self.jobs.extend(jobs)
+            for job in jobs:
+                self.metrics.job_added(job)
+                self.job_changed(job)
+            for job in jobs[:max(0, IMPORT_PREFETCH - added)]: self.prefetch(job)
+            batch.clear()
+            if priority: self._reschedule()
+            self._wake_pool()
+            if on_batch: on_batch(jobs)
+            return len(jobs)
+
+        for url in urls:
+            key = media_key(url)
+            if not key: continue
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            batch.append(url)
+            if len(batch) >= batch_size: added += flush()
+        if batch: added += flush()
+        return ImportResult(added, duplicates)
+
+    def add_playlist(self, url, type='audio', format=None, start_time='', end_time='', priority=0, rate_limit=0,
+                     start=1, end=None, limit=None, date_after=None, date_before=None):
+        """Expands a playlist or channel URL in the background, queueing its entries page by page.
+
+        Returns the PlaylistExpander. New jobs are announced through `on_update`,
+        and a running queue starts on them before the listing is complete. See
+        PlaylistExpander for the range, limit and date filters.
+        """
+        parse_trim(start_time, end_time)
+
+        def on_entries(entries):
+            for entry in entries:
+                # Flat entries already carry title and duration; full extraction waits for the download
+                job = self.add(entry_url(entry), type, format, start_time, end_time, priority, rate_limit, prefetch=False)
+                job.apply_info(entry)
+                if entry_date(entry) is None:
+                    job.date_after, job.date_before = expander.date_after, expander.date_before
+                    self.job_changed(job)
+                self.notify(job)
+            self._wake_pool()
+
+        expander = PlaylistExpander(url, on_entries, start, end, limit, date_after, date_before,
+                                    on_done=self._expansion_done, log=self.log)
+        with self._add_lock:
+            self._expanders.add(expander)
+        expander.start()
+        return expander
+
+    def _expansion_done(self, expander):
+        with self._add_lock:
+            self._expanders.discard(expander)
+        self._wake_pool()
+
+    def expanding(self):
+        """True while a playlist is still being listed into the queue."""
+        return bool(self._expanders)
+
+    def cancel_expansions(self):
+        with self._add_lock:
+            expanders = list(self._expanders)
+        for expander in expanders: expander.cancel()
+
+    def _wake_pool(self):
+        pool = self._pool
+        if pool: pool.wake()
+
+    def _reschedule(self):
+        pool = self._pool
+        if pool: pool.reschedule()
+
+    def set_priority(self, job, priority):
+        """Changes a job's priority; a running queue picks it up for its next claim."""
+        job.priority = priority
+        self.job_changed(job)
+        self._reschedule()
+
+    def move(self, job_ids, step):
+        """Moves the given jobs one place up (step -1) or down (step 1) in the queue.
+
+        Returns False, changing nothing, if one of them is already at that end.
+        """
+        swapped = self.jobs.move(job_ids, step)
+        if swapped is None: return False
+        # Keep seq in queue order, so the journal restores the new order
+        for a, b in swapped:
+            a.seq, b.seq = b.seq, a.seq
+            self.job_changed(a)
+            self.job_changed(b)
+        self._reschedule()
+        return True
+
+    def set_rate_limit(self, rate):
+        """Changes the global bandwidth cap (bytes per second, 0 for none), also for running downloads."""
+        self.bandwidth.set_rate(rate)
+
+    def set_job_rate_limit(self, job, rate):
+        """Changes a job's own bandwidth cap; applies right away if the job is downloading."""
+        job.rate_limit = rate
+        self.job_changed(job)
+        bucket = self._job_buckets.get(job.id)
+        if bucket: bucket.set_rate(rate)
+
+    def add_many(self, urls, **options):
+        """Adds every non-blank URL with the same options. Returns the new jobs."""
+        return [self.add(url, **options) for url in urls if url.strip()]
+
+    def get(self, job_id):
+        """Returns the job with the given id, or None."""
+        return self.jobs.get(job_id)
+
+    def remove(self, job_ids):
+        """Removes the jobs with the given ids from the queue and returns them."""
+        removed = self.jobs.remove(job_ids)
+        self.metrics.forget([job.id for job in removed])
+        if self.journal: self.journal.forget([job.id for job in removed])
+        return removed
+
+    def clear(self):
+        self.cancel_expansions()
+        self.metrics.forget([job.id for job in self.jobs])
+        self.jobs.clear()
+        if self.journal: self.journal.clear()
+
+    def job_changed(self, job):
+        """Records an edited job (type, format, trim) in the journal."""
+        if self.journal: self.journal.record(job)
+
+    def restore(self):
+        """Re-queues the Pending and interrupted jobs from the journal and returns them.
+
+        Interrupted jobs go back to Pending; their .part files are continued when
+        they run again. Finished jobs are dropped from the journal.
+        """
+        if not self.journal: return []
+        restored, finished = [], []
+        for row in self.journal.load():
+            self.job_counter = max(self.job_counter, row['seq'])
+            if row['id'] in self.jobs: continue
+            if row['status'] in FINISHED_STATUSES:
+                finished.append(row['id'])
+                continue
+            job = Job(**row)
+            job.status = 'Pending'
+            job.progress = 0.0
+            self.jobs.add(job)
+            self.metrics.job_added(job)
+            self.job_changed(job)
+            self.prefetch(job)
+            restored.append(job)
+        self.journal.forget(finished)
+        return restored
+
+    def prefetch(self, job):
+        """Starts background metadata extraction for a job, or applies cached info right away."""
+        info = self.info_cache.get(job.url)
+        if info is not None:
+            job.apply_info(info)
+        elif self.prefetcher:
+            with self._awaiting_lock:
+                self._awaiting_info.setdefault(normalize_url(job.url), []).append(job)
+            # The archive check matches the URL against every yt-dlp extractor; the GUI calls this
+            # from the Tk thread, so it runs on the prefetch pool, and archived jobs are not extracted
+            self.prefetcher.submit(job.url, skip=lambda: self.archived_by_url(job))
+
+    def _info_ready(self, url, info):
+        """Prefetcher callback: applies fresh metadata to the queued jobs for that URL."""
+        with self._awaiting_lock:
+            jobs = self._awaiting_info.pop(normalize_url(url), [])
+        if info is None: return
+        for job in jobs:
+            if job.id in self.jobs:
+                job.apply_info(info)
+                self.notify(job)
+
+    def close(self):
+        """Stops the prefetch stage, closes pooled sessions and flushes and closes the journal, if any."""
+        self.cancel_expansions()
+        if self.prefetcher: self.prefetcher.close()
+        self.sessions.close()
+        self.metrics.close()
+        if self.journal: self.journal.close()
+
+    def set_status(self, job, status, progress=None):
+        """Updates a job's state and notifies the `on_update` listener."""
+        job.status = status
+        if progress is not None: job.progress = progress
+        if self.journal: self.journal.record(job)
+        self.notify(job)
+
+    def notify(self, job):
+        """Tells the `on_update` listener that a job changed."""
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                self.log(f"Error in update listener: {e}")
+
+    def archived_by_url(self, job):
+        """True if the archive holds the job's media, judging by the URL alone (no network I/O)."""
+        if self.archive is None: return False
+        try:
+            media = url_media_id(job.url)
+        except ImportError:
+            return False
+        return media is not None and archive_key(*media, job.type, job.format, job.section_label) in self.archive
+
+    def skip_reason(self, job, info=None):
+        """Returns why a job does not need downloading ("in archive", "file exists", "uploaded ..."), or None."""
+        date = entry_date(info) if info and (job.date_after or job.date_before) else None
+        if date and not date_in_range(date, job.date_after, job.date_before):
+            return f"uploaded {date}, outside the playlist's date range"
+        if self.archive is not None:
+            media = info_media_id(info) if info else None
+            if media and archive_key(*media, job.type, job.format, job.section_label) in self.archive: return "in archive"
+            if self.archived_by_url(job): return "in archive"
+        if self.skip_existing and self.output_index is not None and info and info.get('title'):
+            if self.expected_filename(job, info['title']) in self.output_index: return "file exists"
+        return None
+
+    def record_download(self, job, info, path=None):
+        """Adds a finished job to the archive and its output file to the output index."""
+        if not info: return
+        media = info_media_id(info)
+        if self.archive is not None and media:
+            self.archive.add(archive_key(*media, job.type, job.format, job.section_label))
+        if self.output_index is not None:
+            if path: self.output_index.add(path)
+            if info.get('title'): self.output_index.add(self.expected_filename(job, info['title']))
+
+    def expected_filename(self, job, title):
+        """Returns the file name a finished job with this title ends up with."""
+        suffix = f" [{job.section_label}]" if job.section else ''
+        return expected_filename(title, job.format, suffix)
+
+    def _refresh_output_index(self):
+        if self.output_index is None or self.output_index.directory != self.output_dir:
+            self.output_index = OutputIndex(self.output_dir)
+        else:
+            self.output_index.refresh()
+
+    def run(self):
+        """Downloads every Pending job and blocks until the queue drains. Returns the jobs."""
+        self.is_running = True
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._refresh_output_index()
+            self.transcoder = TranscodeStage(self._transcode_started, self._transcode_done, self.transcode_workers)
+            self.metrics.run_started()
+            run_job = self.profiler.wrap(self._run_job) if self.profiler else self._run_job
+            try:
+                self._pool = DownloadWorkerPool(self.jobs, run_job, self.max_workers, self.per_host_limit,
+                                                more_coming=self.expanding, breaker=self.breaker)
+                self._pool.run()
+            finally:
+                self._pool = None
+                # Let the last downloads finish converting before reporting the queue as done
+                self.transcoder.close()
+                self.transcoder = None
+            if self.metrics.jobs: self.log(self.metrics.summary())
+        finally:
+            self.is_running = False
+        return self.jobs
+
+    def _run_job(self, job):
+        # Output printed while the job runs (engine and yt-dlp messages) is attributed to it
+        with job_context(job.id):
+            self.download_job(job)
+
+    def download_job(self, job):
+        """Downloads a single job. Runs on a worker thread of the download pool."""
+        metrics = self.metrics.job_started(job)
+        host = job_host(job.url)
+        job.retry_at = 0.0
+        job.attempts += 1
+        try:
+            info = self.info_cache.get(job.url)
+            if info is None and self.prefetcher and not self.archived_by_url(job):
+                info = self.prefetcher.wait(job.url)
+            reason = self.skip_reason(job, info)
+            if reason: return self._skipped(job, host, reason)
+
+            self.set_status(job, 'Downloading...', 0.0)
+            # Every download charges the shared global bucket, plus a bucket of its own
+            bucket = self._job_buckets[job.id] = TokenBucket(job.rate_limit)
+            throttle = JobThrottle([self.bandwidth, bucket])
+            throttled = bool(self.bandwidth.rate or job.rate_limit)
+            ydl_opts = build_ydl_opts(job, self.output_dir, lambda d, j=job: self.progress_hook(d, j, throttle),
+                                      throttled=throttled, postprocessor_hook=metrics.on_postprocess)
+            # Trimmed jobs are fetched by ffmpeg, which reads its input over a single connection
+            downloader = None if job.section else self.segmenter
+            with self.sessions.session(ydl_opts, on_retry=lambda message: metrics.note_retry(), downloader=downloader) as ydl:
+                if info is not None:
+                    # Skip the extractor round-trip; process_ie_result mutates its input, so give it a copy
+                    result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                else:
+                    result = ydl.extract_info(job.url, download=True)
+
+            path = downloaded_path(result)
+            if not path:
+                # yt-dlp's daterange filter (see build_ydl_opts) leaves no file once the upload date is known
+                reason = self.skip_reason(job, result)
+                if reason: return self._skipped(job, host, reason)
+                raise RuntimeError("yt-dlp did not report a downloaded file")
+            self.breaker.record_success(host)
+            self.set_status(job, 'Waiting to transcode', 100.0)
+            metrics.start_phase('postprocess_wait')
+            # Blocks while the transcode backlog is full, so raw files don't pile up on disk
+            self.transcoder.submit(job, path, result)
+
+        except Exception as e:
+            self._download_failed(job, host, e)
+        finally:
+            self._job_buckets.pop(job.id, None)
+
+    def _skipped(self, job, host, reason):
+        self.breaker.release(host)
+        self.set_status(job, 'Skipped', 100.0)
+        self.metrics.job_finished(job, 'Skipped')
+        self.log(f"Skipping {job.url}: {reason}")
+
+    def _download_failed(self, job, host, error):
+        """Queues a failed job for another attempt if the failure is worth retrying, else marks it Error."""
+        failure = classify_error(error)
+        if failure.kind == PERMANENT:
+            self.breaker.release(host)
+        elif self.breaker.record_failure(host, failure):
+            until = self.breaker.open_until(host) - time.monotonic()
+            self.log(f"{host or job.url} keeps failing; pausing its downloads for {until:.0f}s")
+        pool = self._pool
+        if pool is None or not self.retry_policy.should_retry(failure, job.attempts):
+            self.set_status(job, 'Error')
+            self.metrics.job_finished(job, 'Error')
+            gave_up = f" ({failure.kind}, gave up after {job.attempts} attempts)" if failure.kind != PERMANENT else ''
+            self.log(f"\nERROR downloading {job.url}{gave_up}: {error}")
+            return
+
+        # Prefetched info holds signed media URLs, which may be what expired; the retry extracts afresh
+        self.info_cache.discard(job.url)
+        delay = self.retry_policy.delay(failure, job.attempts)
+        job.retry_at = time.monotonic() + delay
+        metrics = self.metrics.get(job)
+        if metrics:
+            metrics.note_retry()
+            metrics.start_phase('queued')
+        self.set_status(job, RETRY_STATUS, 0.0)
+        what = "rate-limited" if failure.kind == RATE_LIMITED else "failed"
+        self.log(f"{job.url} {what} (attempt {job.attempts} of {self.retry_policy.max_attempts}), "
+                 f"retrying in {delay:.0f}s: {error}")
+        pool.requeue(job)
+
+    def _transcode_started(self, job):
+        metrics = self.metrics.get(job)
+        if metrics: metrics.start_phase('postprocess')
+        self.set_status(job, 'Transcoding...')
+
+    def _transcode_done(self, job, path, error, info):
+        if error is not None:
+            self.set_status(job, 'Error')
+            self.metrics.job_finished(job, 'Error')
+            self.log(f"\nERROR converting {job.url}: {error}")
+            return
+        try:
+            self.record_download(job, info, path)
+        except Exception as e:
+            self.log(f"Error recording finished download: {e}")
+        self.set_status(job, 'Complete', 100.0)
+        self.metrics.job_finished(job, 'Complete')
+
+    def progress_hook(self, d, job, throttle=None):
+        """yt-dlp progress hook for a job. With a throttle, blocks as long as the bandwidth caps require."""
+        metrics = self.metrics.get(job)
+        if metrics: metrics.on_progress(d)
+        if d['status'] == 'downloading':
+            total_bytes = d.get('total_bytes_estimate') or d.get('total_bytes')
+            if total_bytes:
+                percentage = (d.get('downloaded_bytes', 0) / total_bytes) * 100
+                self.set_status(job, f'Downloading {percentage:.1f}%', percentage)
+        elif d['status'] == 'finished':
+            self.set_status(job, 'Processing...', 100.0)
+        if throttle: throttle.update(d)
@@ -0,0 +1,731 @@
+"""Tk front end for the download engine."""
+import io
+import os
+import sys
+import tkinter as tk
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+import threading
+import subprocess
+from ttkthemes import ThemedTk
+
+from .channel import LatestValueChannel
+from .engine import AUDIO_FORMATS, VIDEO_FORMATS, DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST_LIMIT, DownloadEngine, parse_trim
+from .archive import DownloadArchive
+from .bandwidth import format_rate, parse_rate
+from .importer import open_source, read_urls
+from .journal import QueueJournal
+from .logs import LOG_RING_SIZE, LogFile, LogRing, current_job
+from .playlist import parse_date
+from .sessions import ffmpeg_capabilities
+
+# Configuration file to store the last used directory
+CONFIG_FILE = "config.txt"
+
+# Queue journal kept next to the config file, so the queue survives restarts
+JOURNAL_FILE = "queue.db"
+
+# Archive of finished downloads, used to skip media that was already fetched
+ARCHIVE_FILE = "archive.txt"
+
+# Full log of the console output, rotated by size
+LOG_FILE = "downloader.log"
+
+# How often the Tk thread applies queued job updates and console output
+UI_REFRESH_MS = 66 # ~15 Hz
+
+# Buffered log lines are written to the log file at least this often, in seconds
+LOG_FILE_FLUSH_SECONDS = 2.0
+
+# Job priorities offered in the queue; higher values start first
+PRIORITY_LABELS = {1: 'High', 0: 'Normal', -1: 'Low'}
+
+# Bandwidth caps offered for the whole queue and for single jobs
+RATE_CHOICES = ['Unlimited', '256 KB/s', '512 KB/s', '1 MB/s', '2 MB/s', '5 MB/s', '10 MB/s', '20 MB/s']
+
+def format_duration(seconds):
+    """Formats a duration in seconds as H:MM:SS (or M:SS), or "" when unknown."""
+    if not seconds: return ""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def format_size(num_bytes):
+    """Formats a byte count as a short human readable size, or "" when unknown."""
+    if not num_bytes: return ""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+class LogConsole:
+    """Stands in for stdout/stderr and shows the output in a Text widget.
+
+    Writes may come from any thread. They go into a bounded LogRing (and the
+    log file, if any), tagged with the job the writing thread works on.
+    `flush_to_widget` inserts the new lines once per frame in a single call,
+    and the widget never holds more lines than the ring.
+    """
+    def __init__(self, text_widget, log_file=None, max_lines=LOG_RING_SIZE):
+        self.text_space = text_widget
+        self.log_file = log_file
+        self.max_lines = max_lines
+        self.ring = LogRing(max_lines, on_line=log_file.write if log_file else None)
+        self.job_filter = None # job ids to show, or None for everything
+        self._shown_seq = 0
+
+    def write(self, string):
+        self.ring.write(string, current_job())
+
+    def flush(self):
+        pass
+
+    def flush_to_widget(self):
+        """Inserts the lines written since the last frame into the widget. Tk thread only."""
+        if self.log_file: self.log_file.flush(max_age=LOG_FILE_FLUSH_SECONDS)
+        records = self.ring.since(self._shown_seq)
+        if not records: return
+        self._shown_seq = records[-1][0]
+        self._append([line for _, job_id, line in records if self.job_filter is None or job_id in self.job_filter])
+
+    def set_filter(self, job_ids):
+        """Shows only the lines of the given jobs (None for all), redrawing from the ring. Tk thread only."""
+        self.job_filter = None if job_ids is None else set(job_ids)
+        self.text_space.delete('1.0', tk.END)
+        records = self.ring.since(0)
+        if records: self._shown_seq = records[-1][0]
+        self._append([line for _, job_id, line in records if self.job_filter is None or job_id in self.job_filter])
+
+    def _append(self, lines):
+        if not lines: return
+        self.text_space.insert(tk.END, '\n'.join(lines) + '\n')
+        # Drop the oldest lines beyond the limit, so the widget stays as small as the ring
+        excess = int(self.text_space.index('end-1c').split('.')[0]) - 1 - self.max_lines
+        if excess > 0: self.text_space.delete('1.0', f'{excess + 1}.0')
+        self.text_space.see(tk.END)
+
+    def close(self):
+        if self.log_file: self.log_file.close()
+
+class CompletionDialog(tk.Toplevel):
+    """Custom dialog window shown on download completion."""
+    def __init__(self, parent, title, directory_path):
+        super().__init__(parent)
+        self.title(title)
+        self.directory_path = directory_path
+        self.transient(parent)
+        self.grab_set()
+        self.resizable(False, False)
+
+        main_frame = ttk.Frame(self, padding="20")
+        main_frame.pack(expand=True, fill=tk.BOTH)
+
+        message = "The download queue has finished processing."
+        ttk.Label(main_frame, text=message, font=('Segoe UI', 10)).pack(pady=(0, 20))
+
+        ok_button = ttk.Button(main_frame, text="OK", command=self.on_ok)
+        ok_button.pack()
+
+        # Center the dialog over the parent window
+        self.update_idletasks()
+        x = parent.winfo_x() + (parent.winfo_width() // 2) - (self.winfo_width() // 2)
+        y = parent.winfo_y() + (parent.winfo_height() // 2) - (self.winfo_height() // 2)
+        self.geometry(f"+{x}+{y}")
+        self.focus_set()
+
+    def on_ok(self):
+        """Handle the OK button click."""
+        self.destroy() # Close the dialog first
+        self.open_folder()
+
+    def open_folder(self):
+        """Opens the specified folder in the default file explorer."""
+        try:
+            if sys.platform == "win32":
+                os.startfile(os.path.realpath(self.directory_path))
+            elif sys.platform == "darwin": # macOS
+                subprocess.run(["open", self.directory_path])
+            else: # Linux
+                subprocess.run(["xdg-open", self.directory_path])
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open folder: {e}", parent=self.master)
+
+class DownloaderApp:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("All-in-One Media Downloader - Batch Edition")
+        self.root.geometry("1000x750")
+        self.root.resizable(True, True)
+
+        self.engine = DownloadEngine(on_update=self.on_job_update)
+        self.download_queue = self.engine.jobs
+        self.is_downloading = False
+
+        # --- Style Configuration ---
+        self.style = ttk.Style(self.root)
+        self.style.configure('TLabel', font=('Segoe UI', 10))
+        self.style.configure('TButton', font=('Segoe UI', 10, 'bold'), padding=8)
+        self.style.configure('Treeview.Heading', font=('Segoe UI', 10, 'bold'))
+        self.style.configure('TLabelframe.Label', font=('Segoe UI', 11, 'bold'))
+
+        # --- Main Paned Window for resizable layout ---
+        paned_window = ttk.PanedWindow(self.root, orient=tk.VERTICAL)
+        paned_window.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # --- Top Frame for Controls ---
+        controls_frame = ttk.Frame(paned_window, padding="10")
+        paned_window.add(controls_frame, weight=0)
+
+        # --- URL Input ---
+        url_frame = ttk.LabelFrame(controls_frame, text="Add Links to Queue", padding="10")
+        url_frame.pack(fill=tk.X, pady=(0, 10))
+        self.url_text = tk.Text(url_frame, height=4, font=('Segoe UI', 10))
+        self.url_text.pack(fill=tk.X, expand=True)
+
+        # --- Settings and Add to Queue Button ---
+        settings_container = ttk.Frame(controls_frame)
+        settings_container.pack(fill=tk.X, expand=True, pady=(0, 10))
+        
+        # --- Format Selection ---
+        format_frame = ttk.LabelFrame(settings_container, text="Format & Type", padding="10")
+        format_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        self.download_type = tk.StringVar(value="audio")
+        audio_radio = ttk.Radiobutton(format_frame, text="Audio", variable=self.download_type, value="audio", command=self.toggle_format_options)
+        audio_radio.grid(row=0, column=0, sticky=tk.W)
+        video_radio = ttk.Radiobutton(format_frame, text="Video", variable=self.download_type, value="video", command=self.toggle_format_options)
+        video_radio.grid(row=1, column=0, sticky=tk.W)
+        self.audio_format = tk.StringVar(value='mp3')
+        self.audio_combo = ttk.Combobox(format_frame, textvariable=self.audio_format, values=AUDIO_FORMATS, state='readonly', width=8)
+        self.audio_combo.grid(row=0, column=1, padx=5)
+        self.video_format = tk.StringVar(value='mp4')
+        self.video_combo = ttk.Combobox(format_frame, textvariable=self.video_format, values=VIDEO_FORMATS, state='disabled', width=8)
+        self.video_combo.grid(row=1, column=1, padx=5)
+
+        # --- Trimming Options ---
+        trim_frame = ttk.LabelFrame(settings_container, text="Trimming (Optional)", padding="10")
+        trim_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        ttk.Label(trim_frame, text="Start:").grid(row=0, column=0, sticky=tk.W)
+        self.start_time_entry = ttk.Entry(trim_frame, width=10)
+        self.start_time_entry.grid(row=0, column=1, padx=5)
+        ttk.Label(trim_frame, text="End:").grid(row=1, column=0, sticky=tk.W)
+        self.end_time_entry = ttk.Entry(trim_frame, width=10)
+        self.end_time_entry.grid(row=1, column=1, padx=5)
+
+        # --- Playlist / Channel Options ---
+        playlist_frame = ttk.LabelFrame(settings_container, text="Playlists & Channels", padding="10")
+        playlist_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        self.expand_playlists = tk.BooleanVar(value=False)
+        ttk.Checkbutton(playlist_frame, text="Expand into items", variable=self.expand_playlists).grid(row=0, column=0, columnspan=4, sticky=tk.W)
+        ttk.Label(playlist_frame, text="Items:").grid(row=1, column=0, sticky=tk.W)
+        self.playlist_start_entry = ttk.Entry(playlist_frame, width=5)
+        self.playlist_start_entry.grid(row=1, column=1, padx=5)
+        ttk.Label(playlist_frame, text="to").grid(row=1, column=2)
+        self.playlist_end_entry = ttk.Entry(playlist_frame, width=5)
+        self.playlist_end_entry.grid(row=1, column=3, padx=5)
+        ttk.Label(playlist_frame, text="Max:").grid(row=1, column=4, sticky=tk.W)
+        self.playlist_limit_entry = ttk.Entry(playlist_frame, width=5)
+        self.playlist_limit_entry.grid(row=1, column=5, padx=5)
+        ttk.Label(playlist_frame, text="After:").grid(row=2, column=0, sticky=tk.W)
+        self.date_after_entry = ttk.Entry(playlist_frame, width=10)
+        self.date_after_entry.grid(row=2, column=1, columnspan=2, padx=5)
+        ttk.Label(playlist_frame, text="Before:").grid(row=2, column=3, sticky=tk.W)
+        self.date_before_entry = ttk.Entry(playlist_frame, width=10)
+        self.date_before_entry.grid(row=2, column=4, columnspan=2, padx=5)
+
+        # --- Add to Queue Button ---
+        add_button_frame = ttk.Frame(settings_container)
+        add_button_frame.pack(side=tk.LEFT, fill=tk.Y, padx=10)
+        self.add_to_queue_button = ttk.Button(add_button_frame, text="Add to Queue", command=self.add_to_queue)
+        self.add_to_queue_button.pack(expand=True, fill=tk.BOTH)
+        self.import_button = ttk.Button(add_button_frame, text="Import File...", command=self.import_file)
+        self.import_button.pack(expand=True, fill=tk.BOTH, pady=(5, 0))
+
+        # --- Queue Management Frame ---
+        queue_frame = ttk.LabelFrame(controls_frame, text="Download Queue (Click cell to edit)", padding="10")
+        queue_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        # --- Treeview for Queue Display ---
+        columns = ('#', 'url', 'title', 'duration', 'size', 'type', 'format', 'trim', 'priority', 'limit', 'status')
+        self.queue_tree = ttk.Treeview(queue_frame, columns=columns, show='headings')
+        for col in columns:
+            self.queue_tree.heading(col, text=col.capitalize())
+        self.queue_tree.column('#', width=40, anchor=tk.CENTER)
+        self.queue_tree.column('url', width=180)
+        self.queue_tree.column('title', width=180)
+        self.queue_tree.column('duration', width=70, anchor=tk.CENTER)
+        self.queue_tree.column('size', width=70, anchor=tk.E)
+        self.queue_tree.column('type', width=60, anchor=tk.CENTER)
+        self.queue_tree.column('format', width=60, anchor=tk.CENTER)
+        self.queue_tree.column('trim', width=120)
+        self.queue_tree.column('priority', width=70, anchor=tk.CENTER)
+        self.queue_tree.column('limit', width=80, anchor=tk.CENTER)
+        self.queue_tree.column('status', width=100, anchor=tk.W)
+        self.queue_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.queue_tree.bind("<Button-1>", self.on_tree_click)
+        
+        scrollbar = ttk.Scrollbar(queue_frame, orient=tk.VERTICAL, command=self.queue_tree.yview)
+        self.queue_tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # --- Queue Control Buttons ---
+        queue_button_frame = ttk.Frame(controls_frame)
+        queue_button_frame.pack(fill=tk.X, pady=(10, 0))
+        self.start_queue_button = ttk.Button(queue_button_frame, text="Start Queue", command=self.start_download_thread)
+        self.start_queue_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(0, 5))
+        self.move_up_button = ttk.Button(queue_button_frame, text="Move Up", command=lambda: self.move_selected(-1))
+        self.move_up_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        self.move_down_button = ttk.Button(queue_button_frame, text="Move Down", command=lambda: self.move_selected(1))
+        self.move_down_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        self.remove_button = ttk.Button(queue_button_frame, text="Remove Selected", command=self.remove_selected)
+        self.remove_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        self.clear_button = ttk.Button(queue_button_frame, text="Clear Queue", command=self.clear_queue)
+        self.clear_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(5, 0))
+
+        # --- Concurrency Options ---
+        concurrency_frame = ttk.Frame(controls_frame)
+        concurrency_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(concurrency_frame, text="Parallel downloads:").pack(side=tk.LEFT)
+        self.max_workers = tk.IntVar(value=DEFAULT_MAX_WORKERS)
+        ttk.Spinbox(concurrency_frame, from_=1, to=16, textvariable=self.max_workers, width=4, state='readonly').pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Label(concurrency_frame, text="Per host (0 = no limit):").pack(side=tk.LEFT)
+        self.per_host_limit = tk.IntVar(value=DEFAULT_PER_HOST_LIMIT)
+        ttk.Spinbox(concurrency_frame, from_=0, to=16, textvariable=self.per_host_limit, width=4, state='readonly').pack(side=tk.LEFT, padx=(5, 15))
+        # Applies immediately, also to downloads that are already running
+        ttk.Label(concurrency_frame, text="Bandwidth limit:").pack(side=tk.LEFT)
+        self.rate_limit = tk.StringVar(value=RATE_CHOICES[0])
+        rate_combo = ttk.Combobox(concurrency_frame, textvariable=self.rate_limit, values=RATE_CHOICES, state='readonly', width=10)
+        rate_combo.pack(side=tk.LEFT, padx=5)
+        rate_combo.bind("<<ComboboxSelected>>", lambda event: self.engine.set_rate_limit(parse_rate(self.rate_limit.get())))
+
+        # --- Bottom Frame for Progress and Status ---
+        bottom_frame = ttk.Frame(paned_window, padding="10")
+        paned_window.add(bottom_frame, weight=1)
+        
+        # --- Save Location ---
+        dir_frame = ttk.LabelFrame(bottom_frame, text="Save Location", padding="10")
+        dir_frame.pack(fill=tk.X, pady=(0, 10))
+        self.output_path = tk.StringVar(value=self.load_last_directory())
+        dir_entry = ttk.Entry(dir_frame, textvariable=self.output_path, state='readonly')
+        dir_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        browse_button = ttk.Button(dir_frame, text="Browse...", command=self.select_directory)
+        browse_button.pack(side=tk.RIGHT)
+
+        # --- Progress and Status ---
+        self.progress_bar = ttk.Progressbar(bottom_frame, orient='horizontal', length=100, mode='determinate')
+        self.progress_bar.pack(fill=tk.X, pady=(0, 10))
+        log_filter_frame = ttk.Frame(bottom_frame)
+        log_filter_frame.pack(fill=tk.X)
+        self.log_selected_only = tk.BooleanVar(value=False)
+        ttk.Checkbutton(log_filter_frame, text="Show log of selected jobs only", variable=self.log_selected_only,
+                        command=self.update_log_filter).pack(side=tk.LEFT)
+        self.status_box = scrolledtext.ScrolledText(bottom_frame, font=('Courier New', 9), wrap=tk.WORD, height=5)
+        self.status_box.pack(fill=tk.BOTH, expand=True)
+        self.queue_tree.bind("<<TreeviewSelect>>", lambda event: self.update_log_filter())
+        
+        # Redirect stdout; the full log also goes to a rotating file
+        self.console = LogConsole(self.status_box, self.open_log_file())
+        sys.stdout = self.console
+        sys.stderr = self.console
+
+        # Worker threads post job updates here; the Tk thread applies them once per frame
+        self.job_updates = LatestValueChannel()
+        self.root.after(UI_REFRESH_MS, self.process_ui_updates)
+
+        # Bring back the jobs that were pending or in flight when the app last closed
+        self.engine.journal = self.open_journal()
+        self.engine.archive = self.open_archive()
+        restored = self.engine.restore()
+        if restored:
+            self.insert_job_rows(restored)
+            print(f"Restored {len(restored)} unfinished job(s) from the previous session.\n")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Probe ffmpeg off the Tk thread; Start Queue then only needs the cached result
+        threading.Thread(target=ffmpeg_capabilities, daemon=True).start()
+
+    def on_tree_click(self, event):
+        """Handle single-click events on the queue tree for in-place editing."""
+        region = self.queue_tree.identify("region", event.x, event.y)
+        if region != "cell":
+            return
+
+        column_id = self.queue_tree.identify_column(event.x)
+        column_index = int(column_id.replace('#', '')) - 1
+        column_name = self.queue_tree['columns'][column_index]
+        
+        item_id = self.queue_tree.identify_row(event.y)
+        if not item_id: return
+
+        job = self.engine.get(item_id)
+        if not job: return
+        # Priority and bandwidth can still be changed while the queue runs
+        if self.is_downloading and column_name not in ('priority', 'limit'): return
+
+        if column_name == 'type':
+            self.create_cell_editor(item_id, column_name, ['Audio', 'Video'])
+        elif column_name == 'format':
+            values = AUDIO_FORMATS if job.type == 'audio' else VIDEO_FORMATS
+            self.create_cell_editor(item_id, column_name, values)
+        elif column_name == 'trim':
+            self.create_trim_editor_dialog(job)
+        elif column_name == 'priority':
+            self.create_cell_editor(item_id, column_name, list(PRIORITY_LABELS.values()))
+        elif column_name == 'limit':
+            self.create_cell_editor(item_id, column_name, RATE_CHOICES)
+
+    def create_cell_editor(self, item_id, column_name, values):
+        """Create a combobox over the selected cell for editing."""
+        x, y, width, height = self.queue_tree.bbox(item_id, column_name)
+        
+        current_value = self.queue_tree.set(item_id, column_name)
+        
+        editor = ttk.Combobox(self.queue_tree, values=values, state='readonly')
+        editor.place(x=x, y=y, width=width, height=height)
+        editor.set(current_value)
+        editor.focus_force()
+
+        editor.after(10, lambda: editor.event_generate('<F4>'))
+
+        def on_editor_close(event):
+            new_value = editor.get()
+            editor.destroy()
+            
+            job = self.engine.get(item_id)
+            if not job: return
+
+            if column_name == 'type':
+                job.set_type(new_value.lower())
+            elif column_name == 'format':
+                job.format = new_value
+            elif column_name == 'priority':
+                priority = next(value for value, label in PRIORITY_LABELS.items() if label == new_value)
+                self.engine.set_priority(job, priority)
+            elif column_name == 'limit':
+                self.engine.set_job_rate_limit(job, parse_rate(new_value))
+            
+            self.engine.job_changed(job)
+            self.refresh_job_row(job, clear_selection=True)
+
+        editor.bind("<FocusOut>", on_editor_close)
+        editor.bind("<Return>", on_editor_close)
+        editor.bind("<<ComboboxSelected>>", on_editor_close)
+
+    def create_trim_editor_dialog(self, job):
+        """Create a dialog to edit the start and end times for a job."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Edit Trim Times")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        dialog.resizable(False, False)
+
+        frame = ttk.Frame(dialog, padding="20")
+        frame.pack()
+
+        ttk.Label(frame, text="Start Time (HH:MM:SS):").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        start_entry = ttk.Entry(frame)
+        start_entry.grid(row=0, column=1, padx=5, pady=5)
+        start_entry.insert(0, job.start_time)
+
+        ttk.Label(frame, text="End Time (HH:MM:SS):").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        end_entry = ttk.Entry(frame)
+        end_entry.grid(row=1, column=1, padx=5, pady=5)
+        end_entry.insert(0, job.end_time)
+
+        def save_and_close():
+            start_time, end_time = start_entry.get().strip(), end_entry.get().strip()
+            try:
+                parse_trim(start_time, end_time)
+            except ValueError as e:
+                messagebox.showerror("Invalid Trim Time", str(e), parent=dialog)
+                return
+            job.start_time = start_time
+            job.end_time = end_time
+            self.engine.job_changed(job)
+            self.refresh_job_row(job, clear_selection=True)
+            dialog.destroy()
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=2, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="OK", command=save_and_close).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+
+    def toggle_format_options(self):
+        if self.download_type.get() == "audio":
+            self.audio_combo.config(state='readonly')
+            self.video_combo.config(state='disabled')
+        else:
+            self.audio_combo.config(state='disabled')
+            self.video_combo.config(state='readonly')
+
+    def job_options(self):
+        """Reads type, format and trim for new jobs. Shows an error and returns None if the trim is invalid."""
+        start_time, end_time = self.start_time_entry.get().strip(), self.end_time_entry.get().strip()
+        try:
+            parse_trim(start_time, end_time)
+        except ValueError as e:
+            messagebox.showerror("Invalid Trim Time", str(e))
+            return None
+
+        job_type = self.download_type.get()
+        return dict(
+            type=job_type,
+            format=self.audio_format.get() if job_type == 'audio' else self.video_format.get(),
+            start_time=start_time,
+            end_time=end_time,
+        )
+
+    def add_to_queue(self):
+        text = self.url_text.get("1.0", tk.END)
+        urls = list(read_urls(io.StringIO(text), 'text'))
+        if not urls:
+            messagebox.showwarning("Warning", "Please enter at least one URL.")
+            return
+
+        options = self.job_options()
+        if options is None: return
+        if self.expand_playlists.get():
+            try:
+                filters = self.playlist_filters()
+            except ValueError as e:
+                messagebox.showerror("Invalid Playlist Filter", str(e))
+                return
+            # Items are listed in the background and show up in the queue as they arrive
+            for url in urls:
+                self.engine.add_playlist(url.strip(), **options, **filters)
+            print(f"Expanding {len(urls)} playlist(s)...\n")
+        else:
+            imported = self.engine.import_urls(urls, **options, on_batch=self.insert_job_rows)
+            if imported.duplicates: print(f"Skipped {imported.duplicates} link(s) already in the queue.\n")
+        self.url_text.delete("1.0", tk.END)
+
+    def import_file(self):
+        """Streams the URLs of a text, CSV or JSON file into the queue on a background thread."""
+        path = filedialog.askopenfilename(title="Import Links", filetypes=[
+            ("Link lists", "*.txt *.csv *.json *.jsonl"), ("All files", "*.*")])
+        if not path: return
+        options = self.job_options()
+        if options is None: return
+        self.import_button.config(state=tk.DISABLED)
+        threading.Thread(target=self.run_import, args=(path, options), daemon=True).start()
+
+    def run_import(self, path, options):
+        def on_batch(jobs):
+            # Rows are added one batch per Tk callback, so the window stays responsive
+            self.root.after(0, self.insert_job_rows, jobs)
+
+        try:
+            with open_source(path) as stream:
+                imported = self.engine.import_urls(read_urls(stream, name=path), **options, on_batch=on_batch)
+            print(f"Imported {imported.added} link(s) from {os.path.basename(path)}, "
+                  f"skipped {imported.duplicates} duplicate(s).\n")
+        except (OSError, ValueError) as e:
+            print(f"Error importing {path}: {e}\n")
+        finally:
+            self.root.after(0, lambda: self.import_button.config(state=tk.NORMAL))
+
+    def playlist_filters(self):
+        """Reads the playlist range, limit and date fields. Raises ValueError for invalid input."""
+        def number(entry, name):
+            text = entry.get().strip()
+            if not text: return None
+            if not text.isdigit() or int(text) < 1:
+                raise ValueError(f"{name} must be a positive whole number")
+            return int(text)
+
+        filters = dict(
+            start=number(self.playlist_start_entry, "First item") or 1,
+            end=number(self.playlist_end_entry, "Last item"),
+            limit=number(self.playlist_limit_entry, "Max items"),
+            date_after=parse_date(self.date_after_entry.get()),
+            date_before=parse_date(self.date_before_entry.get()),
+        )
+        if filters['end'] and filters['end'] < filters['start']:
+            raise ValueError("Last item must not be before the first item")
+        return filters
+
+    def insert_job_rows(self, jobs):
+        """Appends Treeview rows for newly queued jobs; existing rows are left untouched."""
+        for job in jobs:
+            # A job may already have its row (from an update) or be gone again by the time a batch is shown
+            if job.id in self.download_queue and not self.queue_tree.exists(job.id):
+                self.queue_tree.insert('', tk.END, iid=job.id, values=self.job_row_values(job))
+
+    def refresh_job_row(self, job, clear_selection=False):
+        """Rewrites the Treeview row of a single job, adding it if it was queued off the Tk thread
+        (e.g. by a playlist expansion). Can optionally clear the current selection."""
+        if self.queue_tree.exists(job.id):
+            self.queue_tree.item(job.id, values=self.job_row_values(job))
+        elif job.id in self.download_queue:
+            self.queue_tree.insert('', tk.END, iid=job.id, values=self.job_row_values(job))
+        if clear_selection:
+            self.queue_tree.selection_set(())
+
+    def move_selected(self, step):
+        """Moves the selected jobs one place up (-1) or down (1) in the queue."""
+        selected_items = self.queue_tree.selection()
+        if not selected_items: return
+        if not self.engine.move(selected_items, step): return
+
+        rows = sorted(selected_items, key=self.queue_tree.index, reverse=step > 0)
+        for item_id in rows:
+            self.queue_tree.move(item_id, '', self.queue_tree.index(item_id) + step)
+        # The '#' column shows the queue position, which changed for the moved rows and their neighbours
+        for item_id in rows:
+            neighbour = self.queue_tree.prev(item_id) if step > 0 else self.queue_tree.next(item_id)
+            for row in (item_id, neighbour):
+                job = self.engine.get(row) if row else None
+                if job: self.refresh_job_row(job)
+
+    def remove_selected(self):
+        selected_items = self.queue_tree.selection()
+        if not selected_items:
+            messagebox.showwarning("Warning", "Please select items to remove.")
+            return
+        
+        self.engine.remove(selected_items)
+        self.queue_tree.delete(*selected_items)
+
+    def clear_queue(self):
+        if messagebox.askyesno("Confirm", "Are you sure you want to clear the entire queue?"):
+            self.engine.clear()
+            self.queue_tree.delete(*self.queue_tree.get_children())
+
+    def open_journal(self):
+        try:
+            return QueueJournal(JOURNAL_FILE)
+        except Exception as e:
+            print(f"Error opening queue journal, the queue will not be saved: {e}")
+            return None
+
+    def open_archive(self):
+        try:
+            return DownloadArchive(ARCHIVE_FILE)
+        except Exception as e:
+            print(f"Error opening download archive, finished downloads will not be remembered: {e}")
+            return None
+
+    def open_log_file(self):
+        try:
+            return LogFile(LOG_FILE)
+        except Exception as e:
+            print(f"Error opening log file, the log will only be shown on screen: {e}")
+            return None
+
+    def update_log_filter(self):
+        """Applies the "selected jobs only" log filter after it was toggled or the selection changed."""
+        if self.log_selected_only.get():
+            self.console.set_filter(self.queue_tree.selection())
+        elif self.console.job_filter is not None:
+            self.console.set_filter(None)
+
+    def on_close(self):
+        """Flushes the queue journal and the log file before the window closes."""
+        try:
+            self.engine.close()
+        except Exception as e:
+            print(f"Error saving queue: {e}")
+        try:
+            self.console.close()
+        except Exception:
+            pass
+        self.root.destroy()
+
+    def save_last_directory(self, path):
+        try:
+            with open(CONFIG_FILE, 'w') as f: f.write(path)
+        except Exception as e: print(f"Error saving config: {e}")
+
+    def load_last_directory(self):
+        try:
+            if os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, 'r') as f:
+                    path = f.read().strip()
+                    if os.path.isdir(path): return path
+            return os.getcwd()
+        except Exception as e:
+            print(f"Error loading config: {e}")
+            return os.getcwd()
+
+    def select_directory(self):
+        path = filedialog.askdirectory(title="Select a Folder", initialdir=self.output_path.get())
+        if path:
+            self.output_path.set(path)
+            self.save_last_directory(path)
+            print(f"Output directory set to: {path}\n")
+
+    def toggle_controls(self, is_active):
+        state = tk.NORMAL if is_active else tk.DISABLED
+        self.add_to_queue_button.config(state=state)
+        self.remove_button.config(state=state)
+        self.clear_button.config(state=state)
+        self.start_queue_button.config(state=state)
+        self.start_queue_button.config(text="Start Queue" if is_active else "Downloading...")
+
+    def start_download_thread(self):
+        if self.is_downloading: return
+        if not self.download_queue and not self.engine.expanding():
+            messagebox.showerror("Error", "The download queue is empty.")
+            return
+        if not ffmpeg_capabilities():
+            messagebox.showerror("Dependency Missing", "FFmpeg not found.")
+            return
+            
+        # Tk variables are read here, on the Tk thread, before the workers start
+        self.engine.output_dir = self.output_path.get()
+        self.engine.max_workers = self.max_workers.get()
+        self.engine.per_host_limit = self.per_host_limit.get()
+
+        self.toggle_controls(False)
+        self.is_downloading = True
+        
+        download_thread = threading.Thread(target=self.run_queue_download, daemon=True)
+        download_thread.start()
+        
+    def run_queue_download(self):
+        directory = self.engine.output_dir
+        try:
+            self.engine.run()
+        except Exception as e:
+            print(f"Error running the download queue: {e}")
+            return
+        finally:
+            # Whatever happened, the queue can be started again
+            self.is_downloading = False
+            self.root.after(0, self.toggle_controls, True)
+        self.root.after(0, lambda: CompletionDialog(self.root, "Complete", directory))
+
+    def update_overall_progress(self):
+        """Sets the progress bar to the average progress of the jobs in this run. Tk thread only."""
+        jobs = [job for job in self.download_queue if job.status != 'Error']
+        if not jobs:
+            self.progress_bar['value'] = 0
+            return
+        self.progress_bar['value'] = sum(job.progress for job in jobs) / len(jobs)
+
+    def job_row_values(self, job):
+        """Returns the Treeview row values for a job."""
+        return (job.seq, job.url, job.title or "", format_duration(job.duration), format_size(job.filesize),
+                job.type.capitalize(), job.format, job.trim_label, PRIORITY_LABELS.get(job.priority, job.priority),
+                format_rate(job.rate_limit), job.status)
+
+    def on_job_update(self, job):
+        """Engine listener; called from worker threads when a job's state changes."""
+        self.job_updates.post(job.id, job)
+
+    def process_ui_updates(self):
+        """Applies the newest state of every changed job and flushes console output. Runs on the Tk thread."""
+        try:
+            updates = self.job_updates.drain()
+            if updates:
+                for job_id, job in updates:
+                    self.refresh_job_row(job)
+                self.update_overall_progress()
+            self.console.flush_to_widget()
+        except Exception as e:
+            print(f"Error updating GUI: {e}")
+        finally:
+            self.root.after(UI_REFRESH_MS, self.process_ui_updates)
+
+def main():
+    root = ThemedTk(theme="arc")
+    app = DownloaderApp(root)
+    root.mainloop()
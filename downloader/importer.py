@@ -0,0 +1,184 @@
+"""Streaming bulk URL import: text, CSV and JSON readers and canonical media keys for dedup."""
+import collections
+import csv
+import json
+import os
+import sys
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Jobs queued per batch while importing, and how many jobs of an import get their metadata prefetched
+IMPORT_BATCH_SIZE = 1000
+IMPORT_PREFETCH = 100
+
+IMPORT_FORMATS = ('text', 'csv', 'json')
+
+# Column names (CSV header) and object keys (JSON) that hold the URL
+URL_FIELDS = ('url', 'webpage_url', 'original_url', 'link', 'href')
+
+# Query parameters that only track where a link was shared from: utm_* and the *clid click ids
+# everywhere, the rest only on the sites that use them that way (elsewhere they may pick the content)
+_YOUTUBE_TRACKING_PARAMS = {'feature', 'si', 'pp', 'ab_channel'}
+_HOST_TRACKING_PARAMS = {
+    'youtube.com': _YOUTUBE_TRACKING_PARAMS,
+    'music.youtube.com': _YOUTUBE_TRACKING_PARAMS,
+    'youtube-nocookie.com': _YOUTUBE_TRACKING_PARAMS,
+    'youtu.be': _YOUTUBE_TRACKING_PARAMS,
+    'instagram.com': {'igshid', 'igsh'},
+    'twitter.com': {'ref_src', 'ref_url', 's', 't'},
+    'x.com': {'ref_src', 'ref_url', 's', 't'},
+    'soundcloud.com': {'si', 'ref'},
+}
+_DEFAULT_PORTS = {80, 443}
+_YOUTUBE_HOSTS = {'youtube.com', 'music.youtube.com', 'youtube-nocookie.com'}
+# Path prefixes of YouTube URLs whose next path segment is the video id
+_YOUTUBE_ID_PATHS = ('shorts', 'embed', 'live', 'v', 'e')
+
+_JSON_CHUNK = 64 * 1024
+
+ImportResult = collections.namedtuple('ImportResult', 'added duplicates')
+
+def media_key(url):
+    """Returns the canonical key of a URL, the same for every link to the same media.
+
+    Scheme, "www."/"m." prefixes, default ports, fragments, tracking parameters
+    and the order of the remaining query parameters are ignored, and every form
+    of YouTube video link (youtu.be, watch, shorts, embed, live) collapses to
+    "youtube:<id>".
+    Works on the URL text alone, so it is cheap enough for huge imports.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url if '://' in url else f'https://{url}')
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if not host or '.' not in host: return url # search terms like "ytsearch:..." and other non-URLs
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix): host = host[len(prefix):]
+    tracking = _HOST_TRACKING_PARAMS.get(host, ())
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not name.startswith('utm_') and not name.endswith('clid') and name not in tracking]
+    segments = [segment for segment in parts.path.split('/') if segment]
+
+    if host == 'youtu.be' and segments:
+        return f"youtube:{segments[0]}"
+    if host in _YOUTUBE_HOSTS:
+        params = dict(query)
+        if segments == ['watch'] and params.get('v'): return f"youtube:{params['v']}"
+        if len(segments) >= 2 and segments[0] in _YOUTUBE_ID_PATHS: return f"youtube:{segments[1]}"
+        if segments == ['playlist'] and params.get('list'): return f"youtube:playlist:{params['list']}"
+        host = 'youtube.com'
+
+    # A service on another port is another site
+    if port is not None and port not in _DEFAULT_PORTS: host = f"{host}:{port}"
+    path = '/'.join(segments)
+    return f"{host}/{path}?{urlencode(sorted(query))}" if query else f"{host}/{path}"
+
+def detect_format(path, head=''):
+    """Guesses the import format from a file name, or from the first characters of the input (for stdin)."""
+    ext = os.path.splitext(path)[1].lower() if path and path != '-' else ''
+    if ext == '.csv': return 'csv'
+    if ext in ('.json', '.jsonl', '.ndjson'): return 'json'
+    if ext: return 'text'
+    return 'json' if head.lstrip()[:1] in ('[', '{') else 'text'
+
+@contextmanager
+def open_source(path):
+    """Opens an import source for reading as text; "-" is stdin. Undecodable bytes in files are replaced, not fatal."""
+    if path == '-':
+        yield sys.stdin
+        return
+    with open(path, 'r', encoding='utf-8-sig', errors='replace', newline='') as stream:
+        yield stream
+
+def read_urls(stream, fmt='auto', name=''):
+    """Yields the URLs in a text stream one by one, never holding more than a line or JSON value in memory.
+
+    fmt is one of IMPORT_FORMATS, or "auto" to pick it from `name` and the
+    start of the input. Text has one URL per line (blank lines and # comments
+    are skipped), CSV uses the url/link column if there is a header or else
+    the first cell that looks like a URL, and JSON may be an array or JSON
+    lines of URL strings or of objects with a url field.
+    """
+    if fmt == 'auto':
+        head = stream.read(1)
+        while head and head.isspace(): head = stream.read(1)
+        fmt = detect_format(name, head)
+        stream = _Prepended(head, stream)
+    if fmt == 'csv': return _read_csv(stream)
+    if fmt == 'json': return _read_json(stream)
+    return _read_text(stream)
+
+class _Prepended:
+    """A text stream with some already-read text put back in front of it."""
+    def __init__(self, text, stream):
+        self._text = text
+        self._stream = stream
+
+    def read(self, size=-1):
+        text, self._text = self._text, ''
+        if size < 0: return text + self._stream.read()
+        return text + self._stream.read(size - len(text)) if size > len(text) else text
+
+    def __iter__(self):
+        if self._text:
+            text, self._text = self._text, ''
+            yield text + self._stream.readline()
+        yield from self._stream
+
+def _read_text(stream):
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'): yield line
+
+def _read_csv(stream):
+    rows = csv.reader(stream)
+    column = None
+    for row in rows:
+        if column is None:
+            header = [cell.strip().lower() for cell in row]
+            column = next((header.index(field) for field in URL_FIELDS if field in header), -1)
+            if column >= 0: continue
+        if column >= 0:
+            cell = row[column].strip() if column < len(row) else ''
+        else:
+            cell = next((cell.strip() for cell in row if '://' in cell), '')
+        if cell: yield cell
+
+def _read_json(stream):
+    """Decodes the top-level array elements (or JSON lines values) one at a time from a sliding window."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        # Skip separators; the array brackets and commas carry no data
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] in '[],'): position += 1
+        if position < len(buffer):
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof: raise
+                end = None # cut off at the end of the window; read on
+            # A value that ends exactly at the window's end may be a number that continues
+            if end is not None and (end < len(buffer) or eof):
+                position = end
+                yield from _json_urls(value)
+                continue
+        elif eof:
+            return
+        chunk = stream.read(_JSON_CHUNK)
+        buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+def _json_urls(value):
+    if isinstance(value, str):
+        if value.strip(): yield value.strip()
+    elif isinstance(value, dict):
+        url = next((value[field] for field in URL_FIELDS if isinstance(value.get(field), str)), None)
+        if url:
+            yield url.strip()
+        elif isinstance(value.get('entries'), list):
+            # A playlist dump, e.g. yt-dlp's --dump-single-json
+            for entry in value['entries']: yield from _json_urls(entry)
+    elif isinstance(value, list):
+        for item in value: yield from _json_urls(item)
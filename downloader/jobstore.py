@@ -0,0 +1,69 @@
+"""Ordered, id-indexed storage for queued jobs."""
+import threading
+
+class JobStore:
+    """Holds jobs in insertion order with O(1) lookup and removal by id.
+
+    Backed by a dict (which keeps insertion order), guarded by a lock so that
+    worker threads can iterate while the UI thread adds or removes jobs.
+    Iteration works on a snapshot and never sees a half-applied change.
+    """
+    def __init__(self, jobs=()):
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self.extend(jobs)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __bool__(self):
+        return bool(self._jobs)
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._jobs.values()))
+
+    def add(self, job):
+        with self._lock:
+            if job.id in self._jobs: raise ValueError(f"Duplicate job id: {job.id}")
+            self._jobs[job.id] = job
+        return job
+
+    def extend(self, jobs):
+        with self._lock:
+            for job in jobs: self.add(job)
+
+    def get(self, job_id):
+        """Returns the job with the given id, or None."""
+        return self._jobs.get(job_id)
+
+    def remove(self, job_ids):
+        """Removes the jobs with the given ids and returns the removed jobs. Unknown ids are ignored."""
+        with self._lock:
+            return [job for job in (self._jobs.pop(job_id, None) for job_id in job_ids) if job is not None]
+
+    def move(self, job_ids, step):
+        """Moves the given jobs one place up (step -1) or down (step 1).
+
+        Returns the swapped (moved job, displaced job) pairs, or None, changing
+        nothing, if one of the jobs is already at that end of the queue.
+        """
+        with self._lock:
+            order = list(self._jobs.values())
+            positions = {job.id: index for index, job in enumerate(order)}
+            indexes = sorted(positions[job_id] for job_id in set(job_ids) if job_id in positions)
+            if not indexes or indexes[0] + step < 0 or indexes[-1] + step >= len(order): return None
+            swapped = []
+            # Moving a block up goes top to bottom, down goes bottom to top, so it moves as one
+            for index in (indexes if step < 0 else reversed(indexes)):
+                order[index], order[index + step] = order[index + step], order[index]
+                swapped.append((order[index + step], order[index]))
+            self._jobs = {job.id: job for job in order}
+            return swapped
+
+    def clear(self):
+        with self._lock:
+            self._jobs.clear()
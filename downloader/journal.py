@@ -0,0 +1,103 @@
+"""Crash-safe, on-disk journal of the download queue (SQLite in WAL mode)."""
+import sqlite3
+import threading
+
+# How often pending journal changes are written to disk, in seconds
+JOURNAL_FLUSH_INTERVAL = 0.5
+
+_COLUMNS = ('id', 'seq', 'url', 'type', 'format', 'start_time', 'end_time', 'status', 'progress', 'priority', 'rate_limit',
+            'date_after', 'date_before')
+# Columns added after the first release, with their SQL type; older journals are migrated on open
+_ADDED_COLUMNS = {'priority': 'INTEGER DEFAULT 0', 'rate_limit': 'INTEGER DEFAULT 0', 'date_after': 'TEXT', 'date_before': 'TEXT'}
+
+class QueueJournal:
+    """Persists queued jobs and their state so the queue survives a crash or restart.
+
+    `record`, `forget` and `clear` only mark jobs as dirty in memory, so they are
+    cheap enough for the progress-hook hot path. A background thread writes all
+    dirty jobs in a single transaction every `flush_interval` seconds; repeated
+    updates to the same job in between cost one row write.
+    """
+    def __init__(self, path, flush_interval=JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, seq INTEGER, url TEXT, type TEXT, format TEXT, "
+            "start_time TEXT, end_time TEXT, status TEXT, progress REAL, "
+            "priority INTEGER DEFAULT 0, rate_limit INTEGER DEFAULT 0, date_after TEXT, date_before TEXT)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, sql_type in _ADDED_COLUMNS.items():
+            if column not in existing: self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {sql_type}")
+
+        self._lock = threading.Lock()
+        self._dirty = {} # job id -> job to upsert, or None to delete
+        self._cleared = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def record(self, job):
+        """Marks a job as changed; it is written on the next flush."""
+        with self._lock:
+            self._dirty[job.id] = job
+
+    def forget(self, job_ids):
+        """Marks jobs for deletion from the journal."""
+        with self._lock:
+            for job_id in job_ids: self._dirty[job_id] = None
+
+    def clear(self):
+        """Drops every job from the journal on the next flush."""
+        with self._lock:
+            self._dirty.clear()
+            self._cleared = True
+
+    def load(self):
+        """Returns every journaled job as a dict of Job constructor arguments, in queue order."""
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY seq").fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def flush(self):
+        """Writes all pending changes in one transaction."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            cleared, self._cleared = self._cleared, False
+        if not dirty and not cleared: return
+
+        # Snapshot the job fields now; the jobs themselves keep changing on worker threads
+        upserts = [tuple(getattr(job, column) for column in _COLUMNS) for job in dirty.values() if job is not None]
+        deletes = [(job_id,) for job_id, job in dirty.items() if job is None]
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                if cleared: self._conn.execute("DELETE FROM jobs")
+                if deletes: self._conn.executemany("DELETE FROM jobs WHERE id = ?", deletes)
+                if upserts:
+                    self._conn.executemany(
+                        f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                        upserts,
+                    )
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error writing queue journal: {e}")
+
+    def close(self):
+        """Stops the background writer, flushes what is left and closes the database."""
+        if self._stop.is_set(): return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
@@ -0,0 +1,103 @@
+"""Log plumbing: per-thread job attribution, a bounded in-memory ring and a rotating log file."""
+import logging
+import logging.handlers
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Lines kept in memory for the on-screen console
+LOG_RING_SIZE = 5000
+
+# Rotating log file: size per file, number of old files kept, lines buffered between writes
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+LOG_FILE_BUFFER = 200
+
+_context = threading.local()
+
+@contextmanager
+def job_context(job_id):
+    """Attributes everything the current thread logs or prints to job_id while the block runs."""
+    previous = getattr(_context, 'job_id', None)
+    _context.job_id = job_id
+    try:
+        yield
+    finally:
+        _context.job_id = previous
+
+def current_job():
+    """Returns the id of the job the current thread is working on, or None."""
+    return getattr(_context, 'job_id', None)
+
+class LogRing:
+    """Fixed-size, thread-safe ring of (seq, job id, line) records.
+
+    Text is split into lines as it is written; a partial line is held back
+    until its newline arrives. Once the ring is full the oldest lines are
+    dropped, so memory stays flat however long the app runs. `seq` numbers
+    every line ever written, so a reader can ask for what it has not seen.
+    """
+    def __init__(self, maxlen=LOG_RING_SIZE, on_line=None):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=maxlen)
+        self._partial = {} # job id -> unterminated text
+        self.on_line = on_line
+        self.seq = 0
+
+    def write(self, text, job_id=None):
+        if not text: return
+        lines = []
+        with self._lock:
+            text = self._partial.pop(job_id, '') + text
+            *complete, rest = text.split('\n')
+            if rest: self._partial[job_id] = rest
+            for line in complete:
+                self.seq += 1
+                self._records.append((self.seq, job_id, line))
+                lines.append(line)
+        if self.on_line:
+            for line in lines: self.on_line(line, job_id)
+
+    def since(self, seq):
+        """Returns the records written after seq, oldest first (at most the whole ring)."""
+        with self._lock:
+            if not self._records or self._records[-1][0] <= seq: return []
+            if self._records[0][0] > seq: return list(self._records)
+            # Records are numbered consecutively, so the start position follows from the first seq
+            start = seq - self._records[0][0] + 1
+            return [self._records[index] for index in range(start, len(self._records))]
+
+class LogFile:
+    """Rotating log file with buffered writes.
+
+    Lines collect in memory and are written `buffer_lines` at a time, or at
+    once for error lines; `flush` writes whatever is pending. The file rolls
+    over at `max_bytes`, keeping `backups` old files.
+    """
+    def __init__(self, path, max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS, buffer_lines=LOG_FILE_BUFFER):
+        self.path = path
+        target = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        target.setFormatter(logging.Formatter('%(asctime)s %(job)s%(message)s'))
+        self._handler = logging.handlers.MemoryHandler(buffer_lines, flushLevel=logging.ERROR, target=target)
+        # A private logger, so nothing else that uses logging ends up in this file
+        self._logger = logging.Logger('downloader.log')
+        self._logger.addHandler(self._handler)
+        self._last_flush = time.monotonic()
+
+    def write(self, line, job_id=None):
+        if not line.strip(): return
+        level = logging.ERROR if 'ERROR' in line else logging.INFO
+        self._logger.log(level, line, extra={'job': f'[{job_id}] ' if job_id else ''})
+
+    def flush(self, max_age=None):
+        """Writes buffered lines; with max_age, only if the last flush is older than that many seconds."""
+        now = time.monotonic()
+        if max_age is not None and now - self._last_flush < max_age: return
+        self._last_flush = now
+        self._handler.flush()
+
+    def close(self):
+        self._handler.flush()
+        self._handler.target.close()
+        self._handler.close()
@@ -0,0 +1,154 @@
+"""Metadata prefetch stage: concurrent extract_info(download=False) with a TTL cache."""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+from .sessions import SilentLogger
+
+# Prefetch sizing and cache limits
+DEFAULT_PREFETCH_WORKERS = 4
+INFO_CACHE_SIZE = 2000
+# Extracted media URLs are usually signed and expire, so cached info must not live long
+INFO_CACHE_TTL = 30 * 60
+
+def normalize_url(url):
+    """Returns a cache key for a URL: trimmed, lower-case scheme and host, no fragment."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+def estimate_size(info, job_type):
+    """Best-effort download size in bytes for an info dict, or None when unknown."""
+    size = info.get('filesize') or info.get('filesize_approx')
+    if size: return size
+
+    def format_size(f):
+        return f.get('filesize') or f.get('filesize_approx') or 0
+
+    formats = info.get('formats') or []
+    audio = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') != 'none']
+    video = [f for f in formats if f.get('vcodec') not in (None, 'none')]
+    if job_type == 'audio':
+        sizes = [format_size(f) for f in (audio or formats)]
+        return max(sizes, default=0) or None
+    best_video = max((format_size(f) for f in video), default=0)
+    best_audio = max((format_size(f) for f in audio), default=0)
+    return (best_video + best_audio) or None
+
+class InfoCache:
+    """Bounded LRU cache of extracted info dicts keyed by normalized URL, with a TTL."""
+    def __init__(self, max_entries=INFO_CACHE_SIZE, ttl=INFO_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (expires_at, info)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        """Returns the cached info for a URL, or None if missing or expired."""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, url, info):
+        key = normalize_url(url)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, url):
+        with self._lock:
+            self._entries.pop(normalize_url(url), None)
+
+class MetadataPrefetcher:
+    """Runs extract_info(download=False) for queued URLs on a small thread pool.
+
+    Results go into an InfoCache, and `on_info(url, info)` is called from the
+    pool thread (with info=None if nothing could be cached). A URL that is
+    already cached or being fetched is not fetched again. Info is extracted
+    with process=False, so the download stage can run format selection with
+    its own options via YoutubeDL.process_ie_result.
+    """
+    def __init__(self, cache, max_workers=DEFAULT_PREFETCH_WORKERS, on_info=None, log=print):
+        self.cache = cache
+        self.on_info = on_info
+        self.log = log
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='prefetch')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = {} # normalized url -> Future
+        self._closed = False
+
+    def _ydl(self):
+        """Returns this pool thread's YoutubeDL instance used for extraction only."""
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            import yt_dlp
+            ydl = yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'noplaylist': True, 'skip_download': True,
+                                    'logger': SilentLogger()})
+            self._local.ydl = ydl
+        return ydl
+
+    def submit(self, url, skip=None):
+        """Schedules metadata extraction for a URL unless it is cached or already in flight.
+
+        `skip()` is checked on the pool thread first, so slow checks stay off
+        the caller's thread; when it returns True nothing is extracted.
+        """
+        key = normalize_url(url)
+        with self._lock:
+            if self._closed or key in self._inflight or self.cache.get(url) is not None: return
+            self._inflight[key] = self._executor.submit(self._fetch, url, key, skip)
+
+    def _fetch(self, url, key, skip=None):
+        try:
+            info = None if self._closed or (skip and skip()) else self._extract(url)
+            if self.on_info: self.on_info(url, info)
+        except Exception as e:
+            self.log(f"Error in prefetch listener: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _extract(self, url):
+        """Extracts and caches info for a URL. Returns it, or None if it could not be cached."""
+        try:
+            info = self._ydl().extract_info(url, download=False, process=False)
+        except Exception:
+            # Leave it to the download stage, which extracts again and reports the error
+            return None
+        # Only single videos are cached; playlists and redirects are resolved by the download stage
+        if info is None or info.get('_type', 'video') != 'video': return None
+        self.cache.put(url, info)
+        return info
+
+    def wait(self, url, timeout=None):
+        """Waits for an in-flight prefetch of the URL, then returns the cached info (or None)."""
+        with self._lock:
+            future = self._inflight.get(normalize_url(url))
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+        return self.cache.get(url)
+
+    def close(self):
+        """Stops accepting work; queued fetches that have not started are skipped."""
+        self._closed = True
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,255 @@
+"""Per-job phase timings and throughput, exported as JSON lines and Prometheus text format."""
+import cProfile
+import http.server
+import json
+import os
+import pstats
+import threading
+import time
+
+# Where a job spends its time, in the order the phases happen
+PHASES = ('queued', 'metadata', 'download', 'postprocess_wait', 'postprocess')
+
+class JobMetrics:
+    """Timings and transfer figures of one job run.
+
+    A job is always in exactly one phase; `start_phase` closes the current one
+    and adds its duration, so a phase entered twice (e.g. yt-dlp's merge and
+    then the transcode stage, both post-processing) accumulates.
+    """
+    __slots__ = ('job_id', 'url', 'type', 'format', 'status', 'started_at', 'phases', 'bytes', 'peak_speed',
+                 'retries', '_phase', '_phase_started', '_file_bytes')
+
+    def __init__(self, job, queued_since, now=None):
+        now = time.monotonic() if now is None else now
+        self.job_id = job.id
+        self.url = job.url
+        self.type = job.type
+        self.format = job.format
+        self.status = None
+        self.started_at = time.time()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.phases['queued'] = max(0.0, now - queued_since)
+        self.bytes = 0
+        self.peak_speed = 0.0
+        self.retries = 0
+        self._phase = 'metadata'
+        self._phase_started = now
+        self._file_bytes = 0
+
+    def start_phase(self, phase):
+        now = time.monotonic()
+        if self._phase: self.phases[self._phase] += now - self._phase_started
+        self._phase, self._phase_started = phase, now
+
+    def finish(self, status):
+        self.start_phase(None)
+        self.status = status
+
+    def on_progress(self, d):
+        """yt-dlp progress hook: the first bytes end the metadata phase; counts bytes and peak speed."""
+        if d['status'] == 'downloading':
+            if self._phase != 'download': self.start_phase('download')
+            self._file_bytes = d.get('downloaded_bytes') or self._file_bytes
+            self.peak_speed = max(self.peak_speed, d.get('speed') or 0.0)
+        elif d['status'] == 'finished':
+            self.bytes += d.get('total_bytes') or d.get('downloaded_bytes') or self._file_bytes
+            self._file_bytes = 0
+
+    def on_postprocess(self, d):
+        """yt-dlp post-processor hook (e.g. merging video and audio)."""
+        if d.get('status') == 'started': self.start_phase('postprocess')
+
+    def note_retry(self):
+        self.retries += 1
+
+    @property
+    def average_speed(self):
+        """Bytes per second over the download phase, or 0 when nothing was transferred."""
+        seconds = self.phases['download']
+        return self.bytes / seconds if seconds > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'job': self.job_id, 'url': self.url, 'type': self.type, 'format': self.format, 'status': self.status,
+            'started_at': round(self.started_at, 3),
+            'phases': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            'bytes': self.bytes, 'avg_bytes_per_sec': round(self.average_speed, 1),
+            'peak_bytes_per_sec': round(self.peak_speed, 1), 'retries': self.retries,
+        }
+
+class MetricsRecorder:
+    """Collects JobMetrics for an engine and keeps running totals.
+
+    Finished jobs are appended to `jsonl_path` as one JSON object per line,
+    and `prometheus_path` (if given) is rewritten with the totals in
+    Prometheus text format, e.g. for node_exporter's textfile collector.
+    """
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._added = {} # job id -> monotonic time it was queued
+        self._running = {} # job id -> JobMetrics
+        self._run_started = 0.0
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self.jobs = {}
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.bytes = 0
+        self.retries = 0
+
+    def job_added(self, job):
+        with self._lock:
+            self._added[job.id] = time.monotonic()
+
+    def forget(self, job_ids):
+        with self._lock:
+            for job_id in job_ids: self._added.pop(job_id, None)
+
+    def run_started(self):
+        """Marks the start of a queue run; jobs queued earlier count as queued from here."""
+        self._run_started = time.monotonic()
+
+    def job_started(self, job):
+        """Starts the metrics of a job that a worker just claimed. Returns its JobMetrics.
+
+        A job claimed again for a retry keeps its metrics; the wait for the
+        retry counts as queued time, and the phases add up over all attempts.
+        """
+        with self._lock:
+            metrics = self._running.get(job.id)
+            if metrics is not None:
+                metrics.start_phase('metadata')
+                return metrics
+            queued_since = max(self._added.get(job.id, self._run_started), self._run_started)
+            metrics = self._running[job.id] = JobMetrics(job, queued_since)
+        return metrics
+
+    def get(self, job):
+        """Returns the JobMetrics of a running job, or None."""
+        return self._running.get(job.id)
+
+    def job_finished(self, job, status):
+        """Closes a job's metrics, adds them to the totals and exports them."""
+        with self._lock:
+            metrics = self._running.pop(job.id, None)
+            self._added.pop(job.id, None)
+            if metrics is None: return None
+            metrics.finish(status)
+            self.jobs[status] = self.jobs.get(status, 0) + 1
+            for phase, seconds in metrics.phases.items(): self.phase_seconds[phase] += seconds
+            self.bytes += metrics.bytes
+            self.retries += metrics.retries
+            if self._jsonl:
+                self._jsonl.write(json.dumps(metrics.to_dict()) + '\n')
+                self._jsonl.flush()
+            if self.prometheus_path: self._write_prometheus()
+        return metrics
+
+    def prometheus_text(self):
+        """Returns the totals in Prometheus text exposition format."""
+        lines = [
+            '# HELP downloader_jobs_total Jobs finished, by final status.',
+            '# TYPE downloader_jobs_total counter',
+        ]
+        lines += [f'downloader_jobs_total{{status="{status}"}} {count}' for status, count in sorted(self.jobs.items())]
+        lines += [
+            '# HELP downloader_phase_seconds_total Time jobs spent in each phase.',
+            '# TYPE downloader_phase_seconds_total counter',
+        ]
+        lines += [f'downloader_phase_seconds_total{{phase="{phase}"}} {seconds:.4f}' for phase, seconds in self.phase_seconds.items()]
+        lines += [
+            '# HELP downloader_bytes_total Bytes downloaded.',
+            '# TYPE downloader_bytes_total counter',
+            f'downloader_bytes_total {self.bytes}',
+            '# HELP downloader_retries_total Download retries.',
+            '# TYPE downloader_retries_total counter',
+            f'downloader_retries_total {self.retries}',
+            '# HELP downloader_jobs_running Jobs currently being processed.',
+            '# TYPE downloader_jobs_running gauge',
+            f'downloader_jobs_running {len(self._running)}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def _write_prometheus(self):
+        # Write and rename, so a scraper never reads a half-written file
+        tmp = f"{self.prometheus_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, self.prometheus_path)
+
+    def summary(self):
+        """One-line summary of where the finished jobs spent their time."""
+        phases = ', '.join(f"{phase} {seconds:.1f}s" for phase, seconds in self.phase_seconds.items())
+        return f"Time by phase: {phases}; {self.bytes / 1048576:.1f} MB downloaded, {self.retries} retries"
+
+    def close(self):
+        if self._jsonl:
+            self._jsonl.close()
+            self._jsonl = None
+
+class MetricsServer:
+    """Serves a recorder's totals at http://host:port/metrics on a daemon thread."""
+    def __init__(self, recorder, port, host='127.0.0.1'):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = recorder.prometheus_text().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+class QueueProfiler:
+    """Opt-in cProfile of the queue runner's worker threads.
+
+    `wrap(func)` returns a function that runs under a profiler of the calling
+    thread; `dump(path)` merges every thread's profile into one pstats file,
+    to be read with `python -m pstats`.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiles = []
+
+    def wrap(self, func):
+        def profiled(*args, **kwargs):
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active (Python 3.12+ allows only one at a time)
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def dump(self, path):
+        """Writes the merged profile to path. Returns False if nothing was profiled."""
+        with self._lock:
+            profiles = [profile for profile in self._profiles if profile.getstats()]
+        if not profiles: return False
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]: stats.add(profile)
+        stats.dump_stats(path)
+        return True
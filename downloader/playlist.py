@@ -0,0 +1,122 @@
+"""Lazy playlist/channel expansion: streams flat-extracted entries into the queue page by page."""
+import datetime
+import re
+import threading
+
+from .sessions import SilentLogger
+
+# Entries are handed to the queue in pages of this size as the listing arrives
+PLAYLIST_PAGE_SIZE = 50
+
+_DATE_RE = re.compile(r'^\d{8}$')
+
+def parse_date(text):
+    """Validates a YYYYMMDD date and returns it as a string, or None for blank input. Raises ValueError."""
+    text = (text or '').strip()
+    if not text: return None
+    if not _DATE_RE.match(text):
+        raise ValueError(f"Invalid date '{text}', expected YYYYMMDD")
+    datetime.datetime.strptime(text, '%Y%m%d')
+    return text
+
+def entry_date(entry):
+    """Returns an entry's upload date as YYYYMMDD, or None if the listing does not say."""
+    if entry.get('upload_date'): return str(entry['upload_date'])
+    timestamp = entry.get('timestamp') or entry.get('release_timestamp')
+    if timestamp:
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y%m%d')
+    return None
+
+def date_in_range(date, date_after=None, date_before=None):
+    """True if a YYYYMMDD date lies in the inclusive range; either bound may be None."""
+    if date_after and date < date_after: return False
+    if date_before and date > date_before: return False
+    return True
+
+def entry_url(entry):
+    """Returns the URL to queue for a flat playlist entry."""
+    return entry.get('webpage_url') or entry.get('url') or entry.get('original_url')
+
+def iter_entries(info):
+    """Yields the video entries of an info dict, descending into nested playlists (e.g. channel tabs).
+
+    Entries are consumed lazily, so a 10k-video channel is never held in memory as a whole.
+    """
+    if info.get('_type', 'video') == 'video' or 'entries' not in info:
+        yield info
+        return
+    for entry in info['entries']:
+        if not entry: continue
+        if entry.get('_type') == 'playlist' and 'entries' in entry:
+            yield from iter_entries(entry)
+        else:
+            yield entry
+
+class PlaylistExpander(threading.Thread):
+    """Lists a playlist or channel with flat extraction on a background thread.
+
+    Matching entries are passed to `on_entries(entries)` in pages as soon as
+    they are listed, so downloads can start before the listing is complete.
+    `start`/`end` select a 1-based range of the listing, `limit` caps how many
+    entries are queued, and `date_after`/`date_before` (YYYYMMDD, inclusive)
+    drop entries whose listed upload date falls outside the range. Entries
+    without a listed date (e.g. YouTube's flat listings) are kept, and counted
+    in `undated`; their jobs carry the range and are checked once their full
+    info is known (see DownloadEngine.skip_reason).
+    """
+    def __init__(self, url, on_entries, start=1, end=None, limit=None, date_after=None, date_before=None,
+                 page_size=PLAYLIST_PAGE_SIZE, on_done=None, log=print):
+        super().__init__(daemon=True)
+        self.url = url
+        self.on_entries = on_entries
+        self.start_index = max(1, start or 1)
+        self.end_index = end
+        self.limit = limit
+        self.date_after = parse_date(date_after)
+        self.date_before = parse_date(date_before)
+        self.page_size = page_size
+        self.on_done = on_done
+        self.log = log
+        self.queued = 0
+        self.undated = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _date_ok(self, entry):
+        if not (self.date_after or self.date_before): return True
+        date = entry_date(entry)
+        if date is None:
+            self.undated += 1
+            return True
+        return date_in_range(date, self.date_after, self.date_before)
+
+    def run(self):
+        try:
+            import yt_dlp
+            # Errors are raised and logged below, once
+            ydl = yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist', 'lazy_playlist': True,
+                                    'logger': SilentLogger()})
+            info = ydl.extract_info(self.url, download=False, process=False)
+            page = []
+            for index, entry in enumerate(iter_entries(info), 1):
+                if self._cancelled.is_set(): break
+                if index < self.start_index: continue
+                if self.end_index and index > self.end_index: break
+                if not entry_url(entry) or not self._date_ok(entry): continue
+                page.append(entry)
+                self.queued += 1
+                if len(page) >= self.page_size:
+                    self.on_entries(page)
+                    page = []
+                if self.limit and self.queued >= self.limit: break
+            if page and not self._cancelled.is_set(): self.on_entries(page)
+            self.log(f"Playlist expanded: {self.queued} item(s) queued from {self.url}")
+            if self.undated:
+                self.log(f"{self.undated} item(s) had no upload date in the listing; "
+                         f"they are checked against the date range when they download")
+        except Exception as e:
+            self.log(f"\nERROR expanding playlist {self.url}: {e}")
+        finally:
+            if self.on_done: self.on_done(self)
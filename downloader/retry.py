@@ -0,0 +1,185 @@
+"""Failure classification, retry backoff and per-host circuit breakers for the download queue."""
+import collections
+import random
+import re
+import socket
+import threading
+import time
+
+# Failure kinds: worth retrying soon, the host asked us to slow down, or retrying cannot help
+TRANSIENT = 'transient'
+RATE_LIMITED = 'rate-limited'
+PERMANENT = 'permanent'
+
+# Job-level retries, on top of yt-dlp's own per-request retries
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 300.0
+# Rate-limited jobs back off from a longer base delay, unless the server says how long to wait
+DEFAULT_RATE_LIMIT_DELAY = 30.0
+
+# Consecutive failures of a host that open its circuit, and how long it then cools down
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN = 30.0
+DEFAULT_MAX_COOLDOWN = 600.0
+
+_TRANSIENT_STATUSES = {408, 425, 500, 502, 503, 504, 520, 521, 522, 523, 524}
+_STATUS_RE = re.compile(r'HTTP Error (\d{3})')
+_RETRY_AFTER_RE = re.compile(r'retry[- ]after[:= ]+(\d+)', re.IGNORECASE)
+# Messages of errors that are not HTTP statuses; checked in order, first match wins. Permanent
+# reasons come first: "not available in your country; try again later" is no rate limit
+_MESSAGE_KINDS = (
+    (re.compile(r'unsupported url|private video|video unavailable|not available|has been removed|'
+                r'sign in to confirm|members.only|copyright|requested format is not available|no video formats',
+                re.IGNORECASE), PERMANENT),
+    (re.compile(r'too many requests|rate.?limit|try again later', re.IGNORECASE), RATE_LIMITED),
+    (re.compile(r'timed? ?out|connection (?:reset|refused|aborted)|remote end closed|temporary failure|'
+                r'incompleteread|content too short|fragment|network is unreachable|broken pipe|'
+                r'did not get any data|unable to download', re.IGNORECASE), TRANSIENT),
+)
+
+Failure = collections.namedtuple('Failure', 'kind retry_after')
+
+def _causes(error):
+    """Yields an exception and everything it wraps: yt-dlp's exc_info, __cause__ and __context__."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        wrapped = getattr(error, 'exc_info', None)
+        wrapped = wrapped[1] if isinstance(wrapped, tuple) and len(wrapped) > 1 else None
+        error = wrapped or error.__cause__ or error.__context__
+
+def _status(error):
+    """HTTP status of an exception (urllib and yt-dlp's networking errors), or None."""
+    for name in ('status', 'code'):
+        value = getattr(error, name, None)
+        if isinstance(value, int) and 100 <= value < 600: return value
+    return None
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on an HTTP error, or None."""
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None)
+    try:
+        value = headers.get('Retry-After') if headers else None
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None # an HTTP date; fall back to our own backoff
+
+def _status_kind(status):
+    if status == 429: return RATE_LIMITED
+    if status in _TRANSIENT_STATUSES: return TRANSIENT
+    return PERMANENT if 400 <= status < 500 else TRANSIENT
+
+def classify_error(error):
+    """Returns the Failure (kind, retry_after seconds or None) of a download exception.
+
+    HTTP statuses decide first (429 is rate-limited, 408/5xx transient, other
+    4xx permanent), then timeouts and connection errors anywhere in the
+    exception chain, then the error message. Anything unrecognised is
+    permanent, so an unknown failure is never retried in a loop.
+    """
+    causes = list(_causes(error))
+    retry_after = next((seconds for seconds in map(_retry_after, causes) if seconds is not None), None)
+    for cause in causes:
+        status = _status(cause)
+        if status: return Failure(_status_kind(status), retry_after)
+    for cause in causes:
+        if isinstance(cause, (socket.timeout, TimeoutError, ConnectionError)): return Failure(TRANSIENT, retry_after)
+    message = ' '.join(str(cause) for cause in causes)
+    match = _STATUS_RE.search(message)
+    if match: return Failure(_status_kind(int(match.group(1))), retry_after)
+    if retry_after is None:
+        match = _RETRY_AFTER_RE.search(message)
+        if match: retry_after = float(match.group(1))
+    for pattern, kind in _MESSAGE_KINDS:
+        if pattern.search(message): return Failure(kind, retry_after)
+    return Failure(PERMANENT, retry_after)
+
+class RetryPolicy:
+    """Decides whether and when a failed job runs again.
+
+    The delay doubles with every attempt from `base_delay` (or
+    `rate_limit_delay` for rate-limited failures) up to `max_delay`, and is
+    jittered to between half and all of that, so jobs that failed together
+    do not come back together. A server's Retry-After wins if it is longer.
+    """
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 rate_limit_delay=DEFAULT_RATE_LIMIT_DELAY, rng=None):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_delay = rate_limit_delay
+        self._random = rng or random.Random()
+
+    def should_retry(self, failure, attempts):
+        """True if a job that failed with `failure` after `attempts` attempts gets another one."""
+        return failure.kind != PERMANENT and attempts < self.max_attempts
+
+    def delay(self, failure, attempts):
+        """Seconds to wait before the next attempt, after `attempts` failed ones."""
+        base = self.rate_limit_delay if failure.kind == RATE_LIMITED else self.base_delay
+        ceiling = min(self.max_delay, base * 2 ** max(0, attempts - 1))
+        delay = self._random.uniform(ceiling / 2, ceiling)
+        if failure.retry_after is not None: delay = max(delay, min(failure.retry_after, self.max_delay))
+        return delay
+
+class CircuitBreaker:
+    """Per-host circuit breakers, so a failing host cools down while the others keep downloading.
+
+    A host's circuit opens after `failure_threshold` consecutive retryable
+    failures, or at once when it rate-limits us, and stays open for
+    `cooldown` seconds (doubling each time it opens again, up to
+    `max_cooldown`). After that one probe job may run ("half-open"): success
+    closes the circuit, failure opens it again. Thread-safe.
+    """
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, cooldown=DEFAULT_COOLDOWN,
+                 max_cooldown=DEFAULT_MAX_COOLDOWN, clock=time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = {} # host -> consecutive failures
+        self._trips = {} # host -> times opened in a row
+        self._open_until = {} # host -> monotonic time the circuit half-opens
+        self._probing = set() # half-open hosts with a probe job running
+
+    def allow(self, host):
+        """True if a job for host may start now. In the half-open state this lets exactly one probe through."""
+        with self._lock:
+            until = self._open_until.get(host)
+            if until is None: return True
+            if host in self._probing or self.clock() < until: return False
+            self._probing.add(host)
+            return True
+
+    def open_until(self, host):
+        """Monotonic time at which host's circuit half-opens, or None if it is closed."""
+        return self._open_until.get(host)
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._trips.pop(host, None)
+            self._open_until.pop(host, None)
+            self._probing.discard(host)
+
+    def record_failure(self, host, failure):
+        """Counts a retryable failure. Returns True if it opened the host's circuit."""
+        with self._lock:
+            probe = host in self._probing
+            self._probing.discard(host)
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            if not (probe or failure.kind == RATE_LIMITED or failures >= self.failure_threshold): return False
+            trips = self._trips[host] = self._trips.get(host, 0) + 1
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (trips - 1))
+            if failure.retry_after is not None: cooldown = max(cooldown, min(failure.retry_after, self.max_cooldown))
+            self._open_until[host] = self.clock() + cooldown
+            self._failures[host] = 0
+            return True
+
+    def release(self, host):
+        """Ends a probe that neither succeeded nor failed (e.g. the job was skipped or failed permanently)."""
+        with self._lock:
+            self._probing.discard(host)
@@ -0,0 +1,311 @@
+"""Multi-connection downloads: direct HTTP files fetched as parallel byte ranges, and the connection
+budget they share with yt-dlp's concurrent HLS/DASH fragment downloads."""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from .retry import TRANSIENT, classify_error
+
+# Connections a single download may use, and extra connections (beyond each download's first) shared by all
+DEFAULT_SEGMENTS = 4
+DEFAULT_CONNECTION_BUDGET = 12
+
+# Files are split into ranges of at least this size, about two per connection
+MIN_SEGMENT_SIZE = 1024 * 1024
+SEGMENTS_PER_CONNECTION = 2
+READ_SIZE = 64 * 1024
+
+# A range request that drops out is continued this many times before the download fails
+SEGMENT_RETRIES = 3
+# Segment progress is saved for resuming at most this often, in seconds
+STATE_SAVE_INTERVAL = 1.0
+
+# yt-dlp protocols that fetch media as many fragments (HLS, DASH, Smooth Streaming, HDS)
+FRAGMENTED_PROTOCOLS = ('m3u8', 'm3u8_native', 'http_dash_segments', 'dash_frag_urls', 'ism', 'f4m')
+
+def state_path(path):
+    """Where the segment progress of a download into path is kept."""
+    return f"{path}.part.segments"
+
+def is_fragmented(info):
+    return (info.get('protocol') or '') in FRAGMENTED_PROTOCOLS
+
+def is_direct(info):
+    """True for a format yt-dlp would fetch as one plain HTTP(S) file (not live, not cut to a section)."""
+    if info.get('is_live') or info.get('section_start') is not None or info.get('section_end') is not None: return False
+    return bool(info.get('url')) and (info.get('protocol') or '') in ('http', 'https')
+
+class ConnectionBudget:
+    """Extra connections shared by all running downloads.
+
+    Every download keeps its own first connection; `acquire(wanted)` hands
+    out up to `wanted` more without blocking, as many as are free, and
+    `release(count)` returns them. A lone download gets the most out of the
+    budget, downloads running together share it, and nobody waits for it.
+    """
+    def __init__(self, total=DEFAULT_CONNECTION_BUDGET):
+        self.total = max(0, int(total))
+        self._lock = threading.Lock()
+        self._used = 0
+
+    def acquire(self, wanted):
+        with self._lock:
+            granted = max(0, min(wanted, self.total - self._used))
+            self._used += granted
+            return granted
+
+    def release(self, count):
+        with self._lock:
+            self._used = max(0, self._used - count)
+
+class SegmentedDownload:
+    """Downloads one direct HTTP(S) URL into `path` over up to `connections` parallel byte ranges.
+
+    The data is written straight into a preallocated "<path>.part", which
+    is renamed to `path` once complete. The progress of every segment is
+    saved next to it (see `state_path`), so an interrupted download continues
+    each segment where it stopped; a plain .part left by a single-connection
+    download is kept as a finished prefix. A server that ignores ranges gets
+    one plain connection. The connections beyond the first are taken from
+    `budget` (a ConnectionBudget) once the plan shows how many segments there
+    are, and returned at the end. `progress(d)` receives yt-dlp style
+    progress dicts; segment threads report concurrently, so a report may
+    arrive after a newer one. `urlopen` is YoutubeDL.urlopen, so proxies,
+    cookies and headers work as they do for yt-dlp itself.
+    """
+    def __init__(self, urlopen, url, path, connections=DEFAULT_SEGMENTS, headers=None, progress=None, budget=None):
+        self.urlopen = urlopen
+        self.url = url
+        self.path = path
+        self.part = f"{path}.part"
+        self.state_path = state_path(path)
+        self.connections = max(1, int(connections))
+        self.headers = dict(headers or {})
+        self.progress = progress
+        self.budget = budget
+        self.size = None
+        self.downloaded = 0
+        self._lock = threading.Lock()
+        self._segments = [] # [start, end (exclusive), bytes done]
+        self._pending = deque() # indexes of segments no connection has picked up yet
+        self._failed = None
+        self._started = time.monotonic()
+        self._resumed_bytes = 0
+        self._saved_at = 0.0
+
+    def run(self):
+        """Downloads the file and returns its size. Raises the error of a segment that kept failing."""
+        if not self._load_state():
+            # A one-byte probe finds the size, so every segment request can be bounded
+            try:
+                probe = self._open(0, 0)
+            except Exception as e:
+                if getattr(e, 'status', None) != 416 or self._error_size(e) != 0: raise
+                return self._download_empty()
+            if probe.status != 206:
+                # No range support: the probe is a plain download of the whole file
+                self._download_whole(probe)
+                return self.size
+            probe.close()
+            self.size = self._content_range_total(probe)
+            prefix = os.path.getsize(self.part) if os.path.exists(self.part) else 0
+            # A leftover .part longer than the file is not a prefix of it
+            self._plan(prefix if prefix <= self.size else 0)
+        self.downloaded = self._resumed_bytes = sum(done for _, _, done in self._segments)
+
+        wanted = min(self.connections, len(self._pending)) - 1
+        extra = self.budget.acquire(wanted) if self.budget else max(0, wanted)
+        try:
+            workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(extra)]
+            for worker in workers: worker.start()
+            self._worker()
+            for worker in workers: worker.join()
+        finally:
+            if self.budget: self.budget.release(extra)
+        with self._lock:
+            self._save_state()
+        if self._failed is not None: raise self._failed
+
+        self._finish()
+        return self.size
+
+    def _plan(self, prefix):
+        """Splits the bytes from prefix on into segments and preallocates the .part file."""
+        remaining = self.size - prefix
+        count = max(1, min(self.connections * SEGMENTS_PER_CONNECTION, remaining // MIN_SEGMENT_SIZE))
+        # A whole number of rounds, so no connection is left with a last segment on its own
+        if count > self.connections: count -= count % self.connections
+        step = math.ceil(remaining / count) if remaining else 0
+        self._segments = [[0, prefix, prefix]] if prefix else []
+        for start in range(prefix, self.size, step or 1):
+            self._segments.append([start, min(start + step, self.size), 0])
+        self._pending = deque(index for index, (start, end, done) in enumerate(self._segments) if start + done < end)
+        with open(self.part, 'r+b' if prefix else 'wb') as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, self.size)
+            except (AttributeError, OSError):
+                f.truncate(self.size)
+        with self._lock:
+            self._save_state()
+
+    def _load_state(self):
+        """Picks up the segments of an interrupted download. Returns False if there is nothing to resume."""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if not os.path.exists(self.part) or os.path.getsize(self.part) != state['size']: return False
+            self.size = state['size']
+            self._segments = [list(segment) for segment in state['segments']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self._pending = deque(index for index, (start, end, done) in enumerate(self._segments) if start + done < end)
+        return True
+
+    def _save_state(self):
+        """Writes the segment progress, replacing the old file atomically. Call with _lock held."""
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'url': self.url, 'size': self.size, 'segments': self._segments}, f)
+        os.replace(tmp, self.state_path)
+        self._saved_at = time.monotonic()
+
+    def _open(self, start, end):
+        from yt_dlp.networking import Request
+        headers = dict(self.headers, Range=f"bytes={start}-{'' if end is None else end}")
+        return self.urlopen(Request(self.url, headers=headers))
+
+    @staticmethod
+    def _error_size(error):
+        """File size from the Content-Range of a 416 error ("bytes */<size>"), or None."""
+        headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None)
+        total = ((headers.get('Content-Range') if headers else None) or '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+
+    @staticmethod
+    def _content_range_total(response):
+        total = (response.headers.get('Content-Range') or '').rpartition('/')[2]
+        if not total.isdigit(): raise ValueError("Server did not report the file size in Content-Range")
+        return int(total)
+
+    def _worker(self):
+        """Downloads pending segments until none are left."""
+        while self._failed is None:
+            with self._lock:
+                if not self._pending: break
+                index = self._pending.popleft()
+            try:
+                self._fetch(index)
+            except Exception as e:
+                if self._failed is None: self._failed = e
+
+    def _fetch(self, index):
+        """Fills one segment, continuing it after dropped connections and transient errors."""
+        start, end, _ = self._segments[index]
+        response = None
+        attempts = 0
+        with open(self.part, 'r+b', buffering=0) as f:
+            while self._failed is None:
+                position = start + self._segments[index][2]
+                if position >= end: return
+                try:
+                    if response is None:
+                        response = self._open(position, end - 1)
+                        if response.status != 206: raise ValueError("Server ignored a range request")
+                    f.seek(position)
+                    while position < end and self._failed is None:
+                        block = response.read(min(READ_SIZE, end - position))
+                        if not block: raise ConnectionError(f"Connection closed {end - position} bytes before the end of a segment")
+                        f.write(block)
+                        position += len(block)
+                        self._advance(index, len(block))
+                except Exception as e:
+                    attempts += 1
+                    if attempts > SEGMENT_RETRIES or classify_error(e).kind != TRANSIENT: raise
+                    time.sleep(0.5 * 2 ** (attempts - 1))
+                finally:
+                    if response is not None: response.close()
+                    response = None
+
+    def _advance(self, index, count):
+        with self._lock:
+            self._segments[index][2] += count
+            self.downloaded += count
+            downloaded = self.downloaded
+            if time.monotonic() - self._saved_at >= STATE_SAVE_INTERVAL: self._save_state()
+        # Outside the lock: a throttling progress hook sleeps here, and must only hold up this segment
+        self._report('downloading', downloaded)
+
+    def _report(self, status, downloaded=None):
+        if not self.progress: return
+        downloaded = self.downloaded if downloaded is None else downloaded
+        elapsed = time.monotonic() - self._started
+        speed = (downloaded - self._resumed_bytes) / elapsed if elapsed > 0 else None
+        eta = (self.size - downloaded) / speed if speed and self.size else None
+        self.progress({'status': status, 'filename': self.path, 'tmpfilename': self.part,
+                       'downloaded_bytes': downloaded, 'total_bytes': self.size,
+                       'elapsed': elapsed, 'speed': speed, 'eta': eta})
+
+    def _download_whole(self, response):
+        length = response.headers.get('Content-Length')
+        self.size = int(length) if length and length.isdigit() else None
+        try:
+            with open(self.part, 'wb') as f:
+                while True:
+                    block = response.read(READ_SIZE)
+                    if not block: break
+                    f.write(block)
+                    self.downloaded += len(block)
+                    self._report('downloading')
+        finally:
+            response.close()
+        if self.size is not None and self.downloaded != self.size:
+            raise ConnectionError(f"Download ended after {self.downloaded} of {self.size} bytes")
+        self.size = self.downloaded
+        self._finish()
+
+    def _download_empty(self):
+        open(self.part, 'wb').close()
+        self.size = 0
+        self._finish()
+        return self.size
+
+    def _finish(self):
+        os.replace(self.part, self.path)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        self._report('finished')
+
+class SegmentedDownloader:
+    """Replaces yt-dlp's download step (see sessions.SessionPool.session) to use several connections.
+
+    Direct HTTP(S) formats are fetched with SegmentedDownload; HLS/DASH
+    formats stay with yt-dlp, with as many concurrent fragment downloads as
+    connections were granted. Everything else, and all downloads while
+    `segments` is 1, go to yt-dlp unchanged (except that an interrupted
+    segmented download is always finished as one). The extra connections
+    come from the shared ConnectionBudget and are returned afterwards.
+    """
+    def __init__(self, budget, segments=DEFAULT_SEGMENTS):
+        self.budget = budget
+        self.segments = max(1, int(segments))
+
+    def __call__(self, ydl, name, info, default, progress):
+        fragmented = is_fragmented(info)
+        direct = is_direct(info) and name != '-' and (self.segments > 1 or os.path.exists(state_path(name)))
+        if direct:
+            download = SegmentedDownload(ydl.urlopen, info['url'], name, self.segments, info.get('http_headers'),
+                                         lambda d: progress(dict(d, info_dict=info)), self.budget)
+            download.run()
+            return True, True
+        if not fragmented: return default()
+        extra = self.budget.acquire(self.segments - 1)
+        try:
+            ydl.params['concurrent_fragment_downloads'] = 1 + extra
+            return default()
+        finally:
+            self.budget.release(extra)
@@ -0,0 +1,194 @@
+"""Reusable YoutubeDL sessions and cached ffmpeg/ffprobe capability probes."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Idle YoutubeDL instances kept around for reuse, across all option fingerprints
+MAX_IDLE_SESSIONS = 8
+
+# Options that are applied to a session each time it is checked out instead of being
+# part of its identity; yt-dlp reads them per download, not when the instance is built
+PER_CALL_OPTIONS = ('progress_hooks', 'postprocessor_hooks', 'download_ranges', 'concurrent_fragment_downloads',
+                    'daterange')
+_HOOK_OPTIONS = PER_CALL_OPTIONS[:2]
+
+def options_fingerprint(ydl_opts):
+    """Returns a stable key for the options that shape a YoutubeDL instance."""
+    shared = {key: value for key, value in ydl_opts.items() if key not in PER_CALL_OPTIONS}
+    return json.dumps(shared, sort_keys=True, default=repr)
+
+class SilentLogger:
+    """yt-dlp logger that drops every message, for instances whose errors the caller reports."""
+    def debug(self, message):
+        pass
+
+    info = warning = error = debug
+
+class _Session:
+    """A YoutubeDL instance plus the hooks of the job currently using it.
+
+    The session is also the instance's logger: messages are printed where
+    yt-dlp would print them (none with `quiet`), and retry notices are
+    passed to `on_retry`. Errors are not printed: yt-dlp raises every error
+    it reports, and the engine logs it with the job. yt-dlp's per-format
+    download step (YoutubeDL.dl) goes through `downloader` when the job has
+    one.
+    """
+    __slots__ = ('ydl', 'hooks', 'pp_hooks', 'on_retry', 'downloader', 'quiet', '_default_dl')
+
+    def __init__(self, ydl_opts, quiet=False):
+        import yt_dlp
+        self.quiet = quiet
+        self.hooks = []
+        self.pp_hooks = []
+        self.on_retry = None
+        self.downloader = None
+        shared = {key: value for key, value in ydl_opts.items() if key not in PER_CALL_OPTIONS}
+        shared['logger'] = self
+        self.ydl = yt_dlp.YoutubeDL(shared)
+        self.ydl.add_progress_hook(self._dispatch)
+        self.ydl.add_postprocessor_hook(self._dispatch_pp)
+        self._default_dl = self.ydl.dl
+        self.ydl.dl = self._dl
+
+    def _dl(self, name, info, *args, **kwargs):
+        default = lambda: self._default_dl(name, info, *args, **kwargs)
+        # Subtitle and test downloads (extra arguments) always stay with yt-dlp
+        if self.downloader is None or args or kwargs: return default()
+        return self.downloader(self.ydl, name, info, default, self._dispatch)
+
+    def _dispatch(self, d):
+        for hook in self.hooks: hook(d)
+
+    def _dispatch_pp(self, d):
+        for hook in self.pp_hooks: hook(d)
+
+    # yt-dlp logger interface
+    def debug(self, message):
+        if message.startswith('[debug] '): return
+        # yt-dlp reports HTTP and fragment retries as "... Retrying (1/10)..."
+        if self.on_retry and 'Retrying' in message: self.on_retry(message)
+        if not self.quiet: print(message)
+
+    def info(self, message):
+        if not self.quiet: print(message)
+
+    def warning(self, message):
+        if not self.quiet: print(f"WARNING: {message}", file=sys.stderr)
+
+    def error(self, message):
+        pass
+
+    def close(self):
+        close = getattr(self.ydl, 'close', None)
+        if close: close()
+
+class SessionPool:
+    """Keeps YoutubeDL instances (with their extractors, HTTP connection pools and
+    cookies) keyed by an option fingerprint and lends them out to one job at a time.
+
+    Use `with pool.session(ydl_opts) as ydl:` in place of `with YoutubeDL(ydl_opts) as ydl:`.
+    With `quiet`, the sessions print none of yt-dlp's messages.
+    """
+    def __init__(self, max_idle=MAX_IDLE_SESSIONS, quiet=False):
+        self.max_idle = max_idle
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._idle = OrderedDict() # fingerprint -> [sessions], least recently used first
+        self.created = 0
+        self.reused = 0
+
+    def _checkout(self, key, ydl_opts):
+        with self._lock:
+            sessions = self._idle.get(key)
+            if sessions:
+                session = sessions.pop()
+                if not sessions: del self._idle[key]
+                self.reused += 1
+                return session
+            self.created += 1
+        return _Session(ydl_opts, self.quiet)
+
+    def _checkin(self, key, session):
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(session)
+            self._idle.move_to_end(key)
+            while sum(len(sessions) for sessions in self._idle.values()) > self.max_idle:
+                oldest_key = next(iter(self._idle))
+                evicted.append(self._idle[oldest_key].pop(0))
+                if not self._idle[oldest_key]: del self._idle[oldest_key]
+        for old in evicted: old.close()
+
+    @contextmanager
+    def session(self, ydl_opts, on_retry=None, downloader=None):
+        """Lends out a YoutubeDL configured with ydl_opts. A session that raised is discarded.
+
+        `on_retry(message)` is called whenever yt-dlp retries a request during the loan.
+        `downloader(ydl, name, info, default, progress)` takes over each format
+        download; it may call `default()` to let yt-dlp do it, reports through
+        `progress(d)` and returns what YoutubeDL.dl would, (success, real_download).
+        """
+        key = options_fingerprint(ydl_opts)
+        session = self._checkout(key, ydl_opts)
+        session.hooks = list(ydl_opts.get('progress_hooks') or [])
+        session.pp_hooks = list(ydl_opts.get('postprocessor_hooks') or [])
+        session.on_retry = on_retry
+        session.downloader = downloader
+        for option in PER_CALL_OPTIONS[len(_HOOK_OPTIONS):]:
+            if option in ydl_opts: session.ydl.params[option] = ydl_opts[option]
+            else: session.ydl.params.pop(option, None)
+        try:
+            yield session.ydl
+        except BaseException:
+            session.close()
+            raise
+        session.hooks, session.pp_hooks, session.on_retry, session.downloader = [], [], None, None
+        self._checkin(key, session)
+
+    def close(self):
+        with self._lock:
+            sessions = [session for group in self._idle.values() for session in group]
+            self._idle.clear()
+        for session in sessions: session.close()
+
+_capabilities_lock = threading.Lock()
+_capabilities_cache = {}
+
+def _binary_fingerprint(path):
+    if not path: return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+def _version_line(path):
+    try:
+        output = subprocess.run([path, '-version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    except OSError:
+        return None
+    lines = output.decode('utf-8', 'replace').splitlines()
+    return lines[0].strip() if lines else None
+
+def ffmpeg_capabilities():
+    """Returns {'ffmpeg', 'ffprobe', 'version'} for the ffmpeg on PATH, or None when it is missing.
+
+    The result is cached per binary path, size and modification time, so
+    repeat calls cost a PATH lookup and a stat instead of a subprocess.
+    """
+    ffmpeg, ffprobe = shutil.which('ffmpeg'), shutil.which('ffprobe')
+    fingerprint = (_binary_fingerprint(ffmpeg), _binary_fingerprint(ffprobe))
+    with _capabilities_lock:
+        if fingerprint in _capabilities_cache: return _capabilities_cache[fingerprint]
+
+    version = _version_line(ffmpeg) if ffmpeg else None
+    capabilities = {'ffmpeg': ffmpeg, 'ffprobe': ffprobe, 'version': version} if version else None
+    with _capabilities_lock:
+        _capabilities_cache[fingerprint] = capabilities
+    return capabilities
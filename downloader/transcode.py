@@ -0,0 +1,214 @@
+"""Post-processing stage: converts downloaded files with ffmpeg on a bounded pool of subprocesses."""
+import json
+import os
+import queue
+import subprocess
+import threading
+
+from .logs import job_context
+
+# One ffmpeg process per core; downloads stall once this many files wait for a free slot
+DEFAULT_TRANSCODE_WORKERS = os.cpu_count() or 2
+TRANSCODE_BACKLOG_PER_WORKER = 2
+
+AUDIO_CODEC_ARGS = {
+    'mp3': ['-c:a', 'libmp3lame', '-b:a', '192k'],
+    'm4a': ['-c:a', 'aac', '-b:a', '192k'],
+    'wav': ['-c:a', 'pcm_s16le'],
+}
+# Encoders used for the streams of a video that do not fit the target container
+VIDEO_ENCODER_ARGS = {
+    'mp4': ['-c:v', 'libx264', '-preset', 'veryfast'],
+    'mkv': ['-c:v', 'libx264', '-preset', 'veryfast'],
+    'webm': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-row-mt', '1'],
+}
+VIDEO_AUDIO_ENCODER_ARGS = {
+    'mp4': ['-c:a', 'aac', '-b:a', '192k'],
+    'mkv': ['-c:a', 'aac', '-b:a', '192k'],
+    'webm': ['-c:a', 'libopus', '-b:a', '160k'],
+}
+
+# Source codecs that can be stream-copied into each target; None means any codec fits
+AUDIO_COPY_CODECS = {
+    'mp3': {'mp3'},
+    'm4a': {'aac', 'alac'},
+    'wav': {'pcm_s16le', 'pcm_s24le', 'pcm_s32le', 'pcm_f32le', 'pcm_u8'},
+}
+CONTAINER_VIDEO_CODECS = {
+    'mp4': {'h264', 'hevc', 'av1', 'vp9', 'mpeg4'},
+    'webm': {'vp8', 'vp9', 'av1'},
+    'mkv': None,
+}
+CONTAINER_AUDIO_CODECS = {
+    'mp4': {'aac', 'mp3', 'alac', 'ac3', 'eac3', 'opus'},
+    'webm': {'opus', 'vorbis'},
+    'mkv': None,
+}
+
+# Frames of a trimmed video before its range are cut off once they last longer than this, in seconds
+CUT_TOLERANCE = 0.05
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg fails to convert a file."""
+
+def run_ffmpeg(args):
+    """Runs ffmpeg with the given arguments. Raises TranscodeError with the tail of its output on failure."""
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y'] + args
+    try:
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise TranscodeError(f"Could not run ffmpeg: {e}")
+    if completed.returncode != 0:
+        message = completed.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise TranscodeError(message[-1] if message else f"ffmpeg exited with code {completed.returncode}")
+
+def probe_codecs(path):
+    """Returns {'video': [codecs], 'audio': [codecs]} for a media file, or None if ffprobe fails."""
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_type,codec_name', '-of', 'json', path]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        streams = json.loads(completed.stdout or b'{}').get('streams', [])
+    except (OSError, ValueError):
+        return None
+    if completed.returncode != 0: return None
+    codecs = {'video': [], 'audio': []}
+    for stream in streams:
+        if stream.get('codec_type') in codecs:
+            codecs[stream['codec_type']].append(stream.get('codec_name'))
+    return codecs
+
+def _fits(codecs, allowed):
+    return allowed is None or all(codec in allowed for codec in codecs)
+
+def output_path_for(src, job_format):
+    """Returns the final path for a downloaded file converted to job_format."""
+    return f"{os.path.splitext(src)[0]}.{job_format}"
+
+def section_length(info):
+    """Seconds a section download (yt-dlp's download_ranges) was asked for, or None for a whole file."""
+    if not isinstance(info, dict): return None
+    download = (info.get('requested_downloads') or [info])[-1]
+    start = download.get('section_start')
+    if start is None: return None
+    # An open-ended section runs to the end of the media
+    end = download.get('section_end') or info.get('duration')
+    return end - start if end else None
+
+def leading_seconds(path, clip):
+    """How long a trimmed video of `clip` seconds runs before its range, as (played, hidden) seconds.
+
+    yt-dlp stream-copies a range from the keyframe before its start. The
+    frames before the range are played when the file is longer than the
+    range, or hidden by an MP4 edit list, which gives them negative timestamps.
+    """
+    command = ['ffprobe', '-v', 'error', '-read_intervals', '%+#16', '-show_entries', 'packet=pts_time:format=duration',
+               '-of', 'json', path]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        probed = json.loads(completed.stdout or b'{}')
+        duration = float(probed.get('format', {}).get('duration') or clip)
+        first = min((float(packet['pts_time']) for packet in probed.get('packets', []) if 'pts_time' in packet), default=0.0)
+    except (OSError, ValueError):
+        return 0.0, 0.0
+    return max(0.0, duration - clip), max(0.0, -first)
+
+def plan_transcode(src, dst, job_type, job_format, codecs, lead=(0.0, 0.0)):
+    """Returns the ffmpeg input and codec arguments that turn src into dst (the output path
+    is not included), or None when src can be used as it is.
+
+    Streams whose codec already fits the target are stream-copied; only the
+    others are re-encoded. With unknown codecs (codecs is None) audio is
+    re-encoded and video is stream-copied. `lead` is what a trimmed video
+    holds before its range (see leading_seconds): played frames are cut off,
+    and the video is re-encoded unless the target keeps hidden ones hidden.
+    """
+    if job_type == 'audio':
+        copy = codecs is not None and bool(codecs['audio']) and _fits(codecs['audio'][:1], AUDIO_COPY_CODECS[job_format])
+        if copy and dst == src: return None
+        audio_args = ['-c:a', 'copy'] if copy else AUDIO_CODEC_ARGS[job_format]
+        return ['-i', src, '-vn', '-map', '0:a:0'] + audio_args
+
+    if codecs is None:
+        return None if dst == src else ['-i', src, '-map', '0:v?', '-map', '0:a?', '-c', 'copy']
+    played, hidden = lead
+    seek = ['-ss', f'{played:.3f}'] if played > CUT_TOLERANCE else []
+    # Copied streams keep their leading frames; of the targets only MP4 keeps an edit list hiding them
+    copy = not seek and (hidden <= CUT_TOLERANCE or job_format == 'mp4')
+    copy_video = copy and _fits(codecs['video'], CONTAINER_VIDEO_CODECS[job_format])
+    copy_audio = copy and _fits(codecs['audio'], CONTAINER_AUDIO_CODECS[job_format])
+    if copy_video and copy_audio and dst == src: return None
+    video_args = ['-c:v', 'copy'] if copy_video else VIDEO_ENCODER_ARGS[job_format]
+    audio_args = ['-c:a', 'copy'] if copy_audio else VIDEO_AUDIO_ENCODER_ARGS[job_format]
+    return seek + ['-i', src, '-map', '0:v?', '-map', '0:a?'] + video_args + audio_args
+
+def transcode_file(src, job_type, job_format, clip=None):
+    """Converts a downloaded file to the job's format and returns the final path.
+
+    Streams whose codec already fits the target are remuxed with stream copy;
+    only incompatible streams are re-encoded. A trimmed video (`clip`, see
+    plan_transcode) also gets its start cut exactly.
+    """
+    dst = output_path_for(src, job_format)
+    lead = leading_seconds(src, clip) if clip and job_type == 'video' else (0.0, 0.0)
+    args = plan_transcode(src, dst, job_type, job_format, probe_codecs(src), lead)
+    if args is None: return src
+
+    # Write next to the destination first, so a crash never leaves a half-written final file
+    tmp = f"{os.path.splitext(dst)[0]}.transcoding.{job_format}"
+    full_encode = args[:args.index('-i')] + ['-i', src, '-map', '0:v?', '-map', '0:a?'] + VIDEO_ENCODER_ARGS.get(job_format, []) + VIDEO_AUDIO_ENCODER_ARGS.get(job_format, [])
+    try:
+        try:
+            run_ffmpeg(args + [tmp])
+        except TranscodeError:
+            # A stream copy can still be refused by the muxer; fall back to encoding every stream
+            if job_type == 'audio' or args == full_encode: raise
+            run_ffmpeg(full_encode + [tmp])
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    if dst != src: os.remove(src)
+    return dst
+
+class TranscodeStage:
+    """Bounded pool of ffmpeg workers fed by the download workers.
+
+    `submit` blocks while `backlog` files are already waiting, which holds
+    download workers back instead of letting raw files pile up on disk.
+    `on_start(job)` and `on_done(job, path, error, context)` are called from
+    the stage's worker threads; `context` is whatever was passed to `submit`.
+    """
+    def __init__(self, on_start, on_done, workers=DEFAULT_TRANSCODE_WORKERS, backlog=None):
+        self.on_start = on_start
+        self.on_done = on_done
+        self.workers = max(1, int(workers))
+        self._queue = queue.Queue(maxsize=backlog or self.workers * TRANSCODE_BACKLOG_PER_WORKER)
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads: thread.start()
+
+    def submit(self, job, src, context=None):
+        """Queues a downloaded file for conversion, waiting for room in the backlog."""
+        self._queue.put((job, src, context))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None: return
+                job, src, context = item
+                with job_context(job.id):
+                    self.on_start(job)
+                    try:
+                        clip = section_length(context) if job.section else None
+                        path = transcode_file(src, job.type, job.format, clip)
+                    except Exception as e:
+                        self.on_done(job, None, e, context)
+                    else:
+                        self.on_done(job, path, None, context)
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """Waits for every queued file to be converted, then stops the workers."""
+        self._queue.join()
+        for _ in self._threads: self._queue.put(None)
+        for thread in self._threads: thread.join()
@@ -0,0 +1,39 @@
+"""Shared fixtures: generated media served by the benchmark suite's local MediaServer."""
+import os
+import shutil
+
+import pytest
+
+from benchmarks.media import have_ffmpeg
+from benchmarks.server import MediaServer
+
+@pytest.fixture
+def pipeline():
+    """Skips a test that runs real downloads unless yt-dlp and ffmpeg are available."""
+    pytest.importorskip('yt_dlp')
+    if not have_ffmpeg(): pytest.skip("ffmpeg not available")
+
+@pytest.fixture(scope='session')
+def media_dir(tmp_path_factory):
+    """Cache directory for benchmarks.media files, shared by every test of a run."""
+    if not have_ffmpeg(): pytest.skip("ffmpeg not available")
+    return str(tmp_path_factory.mktemp('media'))
+
+@pytest.fixture
+def serve(tmp_path):
+    """serve(source, count=1, **options) serves `count` copies of a file (item-0.ext, ...) from a
+    MediaServer built with `options` and returns (server, urls). Servers are closed after the test."""
+    servers = []
+
+    def serve(source, count=1, **options):
+        directory = tmp_path / f'served-{len(servers)}'
+        directory.mkdir()
+        ext = os.path.splitext(source)[1]
+        names = [f"item-{index}{ext}" for index in range(count)]
+        for name in names: shutil.copyfile(source, directory / name)
+        server = MediaServer(str(directory), **options)
+        servers.append(server)
+        return server, [server.url(name) for name in names]
+
+    yield serve
+    for server in servers: server.close()
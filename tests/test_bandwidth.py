@@ -0,0 +1,50 @@
+"""Bandwidth limits: token buckets, the per-job throttle and the engine's global cap."""
+import os
+import time
+
+from benchmarks.media import sized_file
+from downloader.bandwidth import DEFAULT_BURST, JobThrottle, TokenBucket
+from downloader.engine import DownloadEngine
+
+def report(downloaded):
+    return {'status': 'downloading', 'downloaded_bytes': downloaded}
+
+def seconds_to_report(throttle, *downloaded):
+    start = time.monotonic()
+    for n in downloaded: throttle.update(report(n))
+    return time.monotonic() - start
+
+def test_resumed_bytes_are_not_charged():
+    bucket = TokenBucket(1024 * 1024)
+    # A job continuing a 3 MB .part reports those bytes with its first read; only later reads are charged
+    resumed = seconds_to_report(JobThrottle([bucket]), 3 * 1024 * 1024 + 65536, 3 * 1024 * 1024 + 2 * 65536)
+    fresh = seconds_to_report(JobThrottle([bucket]), 65536, 2 * 65536)
+    assert resumed + fresh < 0.5
+
+def test_each_file_starts_afresh():
+    bucket = TokenBucket(1024 * 1024)
+    throttle = JobThrottle([bucket])
+    seconds_to_report(throttle, 65536, 2 * 65536)
+    throttle.update({'status': 'finished'})
+    # The audio stream of a video is a file of its own, which may be resumed as well
+    assert seconds_to_report(throttle, 2 * 1024 * 1024, 2 * 1024 * 1024 + 65536) < 0.5
+
+def test_engine_holds_the_global_cap(pipeline, media_dir, serve, tmp_path):
+    cap = 1024 * 1024
+    source = sized_file(media_dir, 'm4a', 2 * 1024 * 1024, seconds=60)
+    server, urls = serve(source, 2)
+    total = 2 * os.path.getsize(source)
+    engine = DownloadEngine(str(tmp_path / 'out'), 2, log=lambda message: None, prefetch_workers=0, skip_existing=False,
+                            rate_limit=cap, segments=1)
+    jobs = engine.add_many(urls, type='audio', format='m4a')
+    start = time.monotonic()
+    try:
+        engine.run()
+    finally:
+        engine.close()
+    elapsed = time.monotonic() - start
+    assert [job.status for job in jobs] == ['Complete', 'Complete']
+    assert server.bytes_sent >= total
+    # The bucket lets DEFAULT_BURST seconds of unused capacity through at the start, and no more
+    assert elapsed >= (total - cap * DEFAULT_BURST) / cap * 0.9
+    assert elapsed < total / cap * 1.5 + 2
@@ -0,0 +1,35 @@
+"""Coalescing hand-off of worker updates to the UI thread (downloader.channel)."""
+import threading
+import time
+
+from downloader.channel import LatestValueChannel
+
+def test_newest_value_per_key_in_first_posted_order():
+    channel = LatestValueChannel()
+    for value in range(3):
+        channel.post('b', value)
+        channel.post('a', value)
+    assert channel.drain() == [('b', 2), ('a', 2)]
+    assert channel.drain() == []
+    assert (channel.posted, channel.drained) == (6, 2)
+
+def test_workers_flooding_a_frame_rate_consumer_are_coalesced():
+    channel = LatestValueChannel()
+    threads, per_thread, keys = 8, 5000, 20
+    applied = {}
+
+    def produce(offset):
+        for index in range(per_thread):
+            channel.post((offset + index) % keys, (offset, index))
+
+    workers = [threading.Thread(target=produce, args=(offset,)) for offset in range(threads)]
+    for worker in workers: worker.start()
+    while any(worker.is_alive() for worker in workers):
+        applied.update(channel.drain())
+        time.sleep(0.01)
+    applied.update(channel.drain())
+    # Every key ends on a value posted last by some worker, and most updates never reach the UI
+    assert len(applied) == keys
+    assert all(index >= per_thread - keys for _, index in applied.values())
+    assert channel.drained < channel.posted / 10
+    assert channel.posted == threads * per_thread
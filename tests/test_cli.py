@@ -0,0 +1,18 @@
+"""Batch CLI output: --quiet leaves the summary and one line per failed job."""
+import os
+
+from benchmarks.media import audio_file
+from downloader.cli import main
+
+def test_quiet_prints_each_error_once(pipeline, media_dir, serve, tmp_path, capfd):
+    server, (url,) = serve(audio_file(media_dir, 'm4a', seconds=1, bitrate='32k'))
+    missing = url.replace(os.path.basename(url), 'missing.m4a')
+    assert main([url, missing, '--quiet', '-o', str(tmp_path / 'out')]) == 1
+    out, err = capfd.readouterr()
+    output = out + err
+    # The prefetch stage, yt-dlp's logger and the engine all see the 404; only the engine reports it
+    assert len([line for line in output.splitlines() if '404' in line]) == 1
+    assert f"ERROR downloading {missing}" in output
+    # yt-dlp's own progress lines stay out of quiet output
+    assert 'Extracting URL' not in output and '[info]' not in output
+    assert out.strip().endswith("Finished: 1 complete, 0 skipped, 1 failed.")
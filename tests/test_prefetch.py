@@ -0,0 +1,23 @@
+"""Metadata prefetch: queued jobs get their info early, and the download stage does not extract it again."""
+from benchmarks.media import audio_file
+from downloader.engine import DownloadEngine
+
+def test_download_stage_uses_prefetched_info(pipeline, media_dir, serve, tmp_path):
+    server, urls = serve(audio_file(media_dir, 'm4a', seconds=1, bitrate='32k'), 4)
+    requests = {}
+    for prefetch_workers in (0, 2):
+        engine = DownloadEngine(str(tmp_path / f'out-{prefetch_workers}'), 1, log=lambda message: None,
+                                prefetch_workers=prefetch_workers, skip_existing=False)
+        jobs = engine.add_many(urls, type='audio', format='m4a')
+        try:
+            if engine.prefetcher:
+                for url in urls: engine.prefetcher.wait(url)
+                assert all(job.title for job in jobs)
+            server.reset_counters()
+            engine.run()
+        finally:
+            engine.close()
+        assert [job.status for job in jobs] == ['Complete'] * len(urls)
+        requests[prefetch_workers] = server.requests
+    # Prefetched jobs skip the extraction request, one per job
+    assert requests[2] == requests[0] - len(urls)
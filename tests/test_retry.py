@@ -0,0 +1,113 @@
+"""Failure classification of download errors, and the engine's retries and circuit breakers against injected faults."""
+import os
+import socket
+import threading
+import time
+import urllib.error
+
+import pytest
+
+from benchmarks.media import audio_file
+from benchmarks.server import MediaServer
+from downloader.engine import DownloadEngine
+from downloader.retry import PERMANENT, RATE_LIMITED, TRANSIENT, CircuitBreaker, RetryPolicy, classify_error
+
+class HTTPStatusError(Exception):
+    """Stands in for yt-dlp's networking HTTPError: a message plus .status and .headers."""
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP Error {status}")
+        self.status = status
+        self.headers = headers or {}
+
+class DownloadError(Exception):
+    """Stands in for yt_dlp.utils.DownloadError, which wraps the real error in exc_info."""
+    def __init__(self, message, cause=None):
+        super().__init__(message)
+        self.exc_info = (type(cause), cause, None) if cause else None
+
+@pytest.mark.parametrize('message, kind', [
+    ("ERROR: [youtube] abc: This video is not available in your country; try again later", PERMANENT),
+    ("ERROR: [youtube] abc: Video unavailable. Please try again later", PERMANENT),
+    ("ERROR: [youtube] abc: Private video. Sign in if you've been granted access", PERMANENT),
+    ("ERROR: Unsupported URL: https://example.com/", PERMANENT),
+    ("ERROR: [generic] Too many requests, please try again later", RATE_LIMITED),
+    ("ERROR: rate-limit reached", RATE_LIMITED),
+    ("ERROR: Unable to download webpage: <urlopen error timed out>", TRANSIENT),
+    ("ERROR: fragment 3 not found, unable to continue", TRANSIENT),
+    ("ERROR: something nobody has seen before", PERMANENT),
+])
+def test_message_kinds(message, kind):
+    assert classify_error(DownloadError(message)).kind == kind
+
+def test_http_status_decides_before_message():
+    assert classify_error(DownloadError("ERROR: not available", HTTPStatusError(503))).kind == TRANSIENT
+    assert classify_error(DownloadError("ERROR: try again later", HTTPStatusError(403))).kind == PERMANENT
+
+def test_rate_limit_with_retry_after():
+    failure = classify_error(DownloadError("ERROR: blocked", HTTPStatusError(429, {'Retry-After': '12'})))
+    assert failure == (RATE_LIMITED, 12.0)
+
+def test_connection_errors_are_transient():
+    assert classify_error(DownloadError("ERROR: boom", socket.timeout())).kind == TRANSIENT
+    assert classify_error(DownloadError("ERROR: boom", ConnectionResetError())).kind == TRANSIENT
+    assert classify_error(urllib.error.HTTPError('http://x', 404, 'Not Found', {}, None)).kind == PERMANENT
+
+def retrying_engine(out_dir, on_update=None):
+    return DownloadEngine(out_dir, 4, on_update=on_update, log=lambda message: None, prefetch_workers=0,
+                          skip_existing=False, retry_policy=RetryPolicy(max_attempts=8, base_delay=0.1, max_delay=1.0,
+                                                                        rate_limit_delay=0.2),
+                          breaker=CircuitBreaker(failure_threshold=2, cooldown=0.25, max_cooldown=1.0))
+
+def run(engine):
+    try:
+        engine.run()
+    finally:
+        engine.close()
+
+def test_jobs_recover_from_injected_faults(pipeline, media_dir, serve, tmp_path):
+    server, urls = serve(audio_file(media_dir, 'm4a', seconds=1, bitrate='32k'), 5, retry_after=0)
+    names = [os.path.basename(url) for url in urls]
+    server.fail(names[0], 503, 503)
+    server.fail(names[1], 'reset')
+    server.fail(names[2], 'truncate')
+    server.fail(names[3], 429)
+    server.fail(names[4], *[404] * 10)
+    engine = retrying_engine(str(tmp_path / 'out'))
+    jobs = engine.add_many(urls, type='audio', format='m4a')
+    run(engine)
+    assert [job.status for job in jobs] == ['Complete'] * 4 + ['Error']
+    assert jobs[0].attempts == 3
+    # A 404 is permanent: one request, no retries
+    assert jobs[4].attempts == 1
+    assert server.faults_served == 6
+
+def test_breaker_holds_back_a_host_in_outage(pipeline, media_dir, serve, tmp_path):
+    healthy, urls = serve(audio_file(media_dir, 'm4a', seconds=1, bitrate='32k'), 6)
+    # Same files on a second port, addressed as "localhost" so it counts as another host
+    failing = MediaServer(healthy.directory)
+    failing.set_outage(503)
+    recovered = []
+
+    def recover():
+        # The outage lasts two seconds from the first request it fails
+        while not failing.faults_served: time.sleep(0.01)
+        time.sleep(2)
+        recovered.append(time.monotonic())
+        failing.set_outage(None)
+
+    finished = {}
+    engine = retrying_engine(str(tmp_path / 'out'),
+                             lambda job: job.status == 'Complete' and finished.setdefault(job.id, time.monotonic()))
+    healthy_jobs = engine.add_many(urls[:3], type='audio', format='m4a')
+    failing_jobs = engine.add_many([failing.url(os.path.basename(url), 'localhost') for url in urls[3:]], type='audio',
+                                   format='m4a')
+    threading.Thread(target=recover, daemon=True).start()
+    try:
+        run(engine)
+    finally:
+        failing.close()
+    assert [job.status for job in healthy_jobs + failing_jobs] == ['Complete'] * 6
+    # The healthy host kept downloading through the outage
+    assert max(finished[job.id] for job in healthy_jobs) < recovered[0]
+    # Retrying without a breaker fails about 12-15 requests in those two seconds; cooling down, about 6
+    assert failing.faults_served <= 8
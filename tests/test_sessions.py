@@ -0,0 +1,47 @@
+"""YoutubeDL session pool: jobs with the same options share one instance instead of building their own."""
+import pytest
+
+from benchmarks.cases import best_of
+from benchmarks.media import audio_file
+from downloader.engine import DownloadEngine
+from downloader.sessions import SessionPool, options_fingerprint
+
+def enter_and_leave(pool, opts):
+    with pool.session(opts):
+        pass
+
+def test_per_call_options_do_not_split_sessions():
+    base = {'format': 'bestaudio', 'outtmpl': 'x'}
+    trimmed = dict(base, progress_hooks=[print], download_ranges=lambda info, ydl: [])
+    assert options_fingerprint(base) == options_fingerprint(trimmed)
+    assert options_fingerprint(base) != options_fingerprint(dict(base, format='best'))
+
+def test_borrowing_is_cheaper_than_building():
+    yt_dlp = pytest.importorskip('yt_dlp')
+    opts = {'quiet': True, 'outtmpl': 'x'}
+    pool = SessionPool()
+    try:
+        with pool.session(opts) as first: pass
+        with pool.session(opts) as second: assert second is first
+        # A session whose job raised is not lent out again
+        with pytest.raises(RuntimeError), pool.session(opts):
+            raise RuntimeError
+        with pool.session(opts) as third: assert third is not first
+        pooled = best_of(3, lambda: [enter_and_leave(pool, opts) for _ in range(10)])
+    finally:
+        pool.close()
+    fresh = best_of(3, lambda: [yt_dlp.YoutubeDL(opts).close() for _ in range(10)])
+    assert pooled < fresh / 5
+
+def test_queue_reuses_sessions(pipeline, media_dir, serve, tmp_path):
+    server, urls = serve(audio_file(media_dir, 'm4a', seconds=1, bitrate='32k'), 4)
+    engine = DownloadEngine(str(tmp_path / 'out'), 1, log=lambda message: None, prefetch_workers=0, skip_existing=False)
+    jobs = engine.add_many(urls[:2], type='audio', format='m4a')
+    # The range is part of a trimmed job's file name, so trimmed jobs share a session per range
+    jobs += engine.add_many(urls[2:], type='audio', format='m4a', start_time='0', end_time='0.5')
+    try:
+        engine.run()
+    finally:
+        engine.close()
+    assert [job.status for job in jobs] == ['Complete'] * 4
+    assert (engine.sessions.created, engine.sessions.reused) == (2, 2)
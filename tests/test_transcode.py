@@ -0,0 +1,37 @@
+"""Transcode stage: streams that fit the target are stream-copied, only the others are re-encoded."""
+import os
+import shutil
+
+import pytest
+
+from benchmarks.cases import child_cpu_seconds
+from benchmarks.media import video_file
+from downloader.transcode import (AUDIO_CODEC_ARGS, VIDEO_AUDIO_ENCODER_ARGS, VIDEO_ENCODER_ARGS, plan_transcode,
+                                  probe_codecs, run_ffmpeg, transcode_file)
+
+def test_plan_copies_only_fitting_streams():
+    aac = {'video': [], 'audio': ['aac']}
+    assert plan_transcode('a.m4a', 'a.m4a', 'audio', 'm4a', aac) is None
+    assert plan_transcode('a.m4a', 'a.mp3', 'audio', 'mp3', aac)[-len(AUDIO_CODEC_ARGS['mp3']):] == AUDIO_CODEC_ARGS['mp3']
+    h264 = {'video': ['h264'], 'audio': ['aac']}
+    assert plan_transcode('v.mp4', 'v.mkv', 'video', 'mkv', h264)[-4:] == ['-c:v', 'copy', '-c:a', 'copy']
+    # WebM takes neither H.264 nor AAC
+    encoders = VIDEO_ENCODER_ARGS['webm'] + VIDEO_AUDIO_ENCODER_ARGS['webm']
+    assert plan_transcode('v.mp4', 'v.webm', 'video', 'webm', h264)[-len(encoders):] == encoders
+
+def test_copy_keeps_codecs_and_costs_less_than_encoding(media_dir, tmp_path):
+    if child_cpu_seconds() is None: pytest.skip("no CPU time of child processes on this platform")
+    source = video_file(media_dir, 'mp4', seconds=5)
+    src = str(tmp_path / 'source.mp4')
+    shutil.copyfile(source, src)
+
+    before = child_cpu_seconds()
+    path = transcode_file(src, 'video', 'mkv')
+    copy = child_cpu_seconds() - before
+    assert os.path.splitext(path)[1] == '.mkv'
+    assert probe_codecs(path) == probe_codecs(source)
+
+    before = child_cpu_seconds()
+    run_ffmpeg(['-i', source] + VIDEO_ENCODER_ARGS['mkv'] + VIDEO_AUDIO_ENCODER_ARGS['mkv'] + [str(tmp_path / 'encoded.mkv')])
+    encode = child_cpu_seconds() - before
+    assert copy < encode / 5
@@ -0,0 +1,55 @@
+"""Trimmed jobs: only the requested range is transferred, and the transcode stage cuts it exactly."""
+import json
+import os
+import subprocess
+
+from benchmarks.media import audio_file, video_file
+from downloader.engine import DownloadEngine
+from downloader.transcode import VIDEO_ENCODER_ARGS, plan_transcode
+
+CODECS = {'video': ['h264'], 'audio': ['aac']}
+
+def run_trimmed(url, out_dir, job_type, job_format, start_time, end_time):
+    engine = DownloadEngine(out_dir, 1, log=lambda message: None, prefetch_workers=0, skip_existing=False)
+    job = engine.add(url, type=job_type, format=job_format, start_time=start_time, end_time=end_time)
+    try:
+        engine.run()
+    finally:
+        engine.close()
+    assert job.status == 'Complete'
+    (name,) = os.listdir(out_dir)
+    return os.path.join(out_dir, name)
+
+def duration(path):
+    output = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+                            stdout=subprocess.PIPE).stdout
+    return float(json.loads(output)['format']['duration'])
+
+def test_trimmed_job_fetches_only_its_range(pipeline, media_dir, serve, tmp_path):
+    source = audio_file(media_dir, 'm4a', seconds=120)
+    server, (url,) = serve(source)
+    path = run_trimmed(url, str(tmp_path / 'out'), 'audio', 'm4a', '60', '72')
+    # A tenth of the file, plus the index ffmpeg reads first
+    assert server.bytes_sent < 0.25 * os.path.getsize(source)
+    assert abs(duration(path) - 12) < 0.1
+
+def test_trimmed_video_is_cut_exactly(pipeline, media_dir, serve, tmp_path):
+    # Keyframes every 250 frames (8.3 s): the range starts between two of them
+    server, (url,) = serve(video_file(media_dir, 'mp4', seconds=30))
+    for job_format in ('mkv', 'mp4'):
+        path = run_trimmed(url, str(tmp_path / job_format), 'video', job_format, '12', '18')
+        assert abs(duration(path) - 6) < 0.1, job_format
+
+def test_plan_cuts_played_leading_frames():
+    args = plan_transcode('in.mkv', 'in.mkv', 'video', 'mkv', CODECS, lead=(3.3, 0.0))
+    assert args[:2] == ['-ss', '3.300']
+    assert 'copy' not in args
+
+def test_plan_keeps_hidden_leading_frames_only_in_mp4():
+    assert plan_transcode('in.mp4', 'in.mp4', 'video', 'mp4', CODECS, lead=(0.0, 3.3)) is None
+    args = plan_transcode('in.mp4', 'in.mkv', 'video', 'mkv', CODECS, lead=(0.0, 3.3))
+    assert '-ss' not in args and 'copy' not in args
+    assert args[args.index('-c:v'):][:len(VIDEO_ENCODER_ARGS['mkv'])] == VIDEO_ENCODER_ARGS['mkv']
+
+def test_plan_copies_an_exact_clip():
+    assert plan_transcode('in.mp4', 'in.mkv', 'video', 'mkv', CODECS, lead=(0.01, 0.0))[-4:] == ['-c:v', 'copy', '-c:a', 'copy']
@@ -0,0 +1,13 @@
+"""Worker pool: jobs run concurrently, each on its own connection."""
+from benchmarks.cases import MIN_WORKER_SPEEDUP, run_queue
+from benchmarks.media import sized_file
+
+def test_workers_download_concurrently(pipeline, media_dir, serve, tmp_path):
+    source = sized_file(media_dir, 'm4a', 512 * 1024)
+    # Each connection is capped, so only running jobs side by side gets the queue done sooner
+    server, urls = serve(source, 8, latency=0.02, bandwidth=1024 * 1024)
+    seconds = {}
+    for workers in (1, 4):
+        seconds[workers], engine = run_queue(urls, str(tmp_path / f'out-{workers}'), workers, engine_options={'segments': 1})
+        assert [job.status for job in engine.jobs] == ['Complete'] * len(urls)
+    assert seconds[1] / seconds[4] >= MIN_WORKER_SPEEDUP